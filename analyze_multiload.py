@@ -1,41 +1,63 @@
-import glob
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import os
 
+from metrics import window_quantile
+from metrics_io import find_metric_files, load_metrics, load_run_events, metric_name
+from phase_log import switch_count
+
 os.makedirs("results/multiload", exist_ok=True)
 
-light_files = sorted(glob.glob("metrics/metrics_*_light.csv"))
-normal_files = sorted(glob.glob("metrics/metrics_*_normal.csv"))
-heavy_files = sorted(glob.glob("metrics/metrics_*_heavy.csv"))
+light_files = find_metric_files("metrics/metrics_*_light")
+normal_files = find_metric_files("metrics/metrics_*_normal")
+heavy_files = find_metric_files("metrics/metrics_*_heavy")
 
 if not (light_files and normal_files and heavy_files):
     print("Error: Run run_multiload_experiments.py first to generate data")
     exit(1)
 
 def extract_controller(filename):
-    base = os.path.basename(filename)
-    return base.replace("metrics_", "").replace("_light.csv", "").replace("_normal.csv", "").replace("_heavy.csv", "").replace("_", " ").title()
+    base = metric_name(filename)
+    return base.replace("metrics_", "").replace("_light", "").replace("_normal", "").replace("_heavy", "").replace("_", " ").title()
 
 def analyze_load(files, load_name):
     results = []
     for f in files:
-        df = pd.read_csv(f)
+        df = load_metrics(f)
         ctrl = extract_controller(f)
 
+        avg_wait = 0
+        if "avg_wait" in df.columns and len(df) > 0:
+            avg_wait = df["avg_wait"].iloc[-1]
+
+        # Exact switch count from the event log saved next to the metrics
+        events = load_run_events(f)
+
+        if "ticks" in df.columns:
+            # One row per sampling window: exact aggregates, p95 from the window maxima (an upper bound)
+            results.append({
+                "controller": ctrl,
+                "load": load_name,
+                "avg_queue": np.average(df["total_queue_mean"], weights=df["ticks"]),
+                "max_queue": df["total_queue_max"].max(),
+                "p95_queue": window_quantile(df["total_queue_max"], df["ticks"], 0.95),
+                "switches": switch_count(events) if events is not None else df["switches"].sum(),
+                "cumulative_queue": df["total_queue_int"].sum(),
+                "avg_wait": avg_wait
+            })
+            continue
+
         switches = 0
-        if "phase" in df.columns:
+        if events is not None:
+            switches = switch_count(events)
+        elif "phase" in df.columns:
             switches = (df["phase"] != df["phase"].shift()).sum() - 1
 
         cumulative_queue = 0
         if "total_queue" in df.columns and "time_s" in df.columns:
             cumulative_queue = np.trapezoid(df["total_queue"], df["time_s"])
 
-        avg_wait = 0
-        if "avg_wait" in df.columns and len(df) > 0:
-            avg_wait = df["avg_wait"].iloc[-1]
-
         results.append({
             "controller": ctrl,
             "load": load_name,
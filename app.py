@@ -5,18 +5,11 @@ Serves the web frontend and provides WebSocket for real-time simulation
 from flask import Flask, send_from_directory, request
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
-import random
 import os
-from typing import Dict
 
-from models import Direction, LightState, Car
-from traffic_controller import TrafficController
-from car_manager import CarManager
-from controllers import (
-    ActuatedThresholdController,
-    MaxPressureController,
-    QTableController
-)
+from models import Direction
+from simulation_core import SimulationCore, core_property
+import policy_store
 
 app = Flask(__name__, static_folder='web', static_url_path='')
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'traffic-simulation-secret')
@@ -26,62 +19,41 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
 # Store per-session simulation states
 sessions = {}
 
+# With POLICY_DIR set, q_learning sessions use the versioned policies in that
+# directory and new versions go live without a restart (see policy_store.py)
+if os.environ.get('POLICY_DIR'):
+    store = policy_store.configure(os.environ['POLICY_DIR'])
+    socketio.start_background_task(store.watch, socketio.sleep)
+
 class SimulationState:
     def __init__(self):
-        self.traffic_controller = TrafficController()
-        self.car_manager = CarManager()
-        self.controller_name = "actuated"
-        self.spawn_rate = 2.0
-        self.last_spawn_time = 0
-        self.current_time = 0
+        # Headless simulation; web sessions do not keep per-tick metrics
+        self.core = SimulationCore(record_metrics=False)
         self.running = False
         self.speed_multiplier = 1.0
-        self._apply_controller(self.controller_name)
+
+    # State owned by the headless core
+    traffic_controller = core_property("traffic_controller")
+    car_manager = core_property("car_manager")
+    controller_name = core_property("controller_name")
+    spawn_rate = core_property("spawn_rate")
+    current_time = core_property("current_time")
 
     def _apply_controller(self, name: str):
-        name = (name or "actuated").lower()
-        self.controller_name = name
-
-        if name == "actuated":
-            self.traffic_controller.set_controller(ActuatedThresholdController())
-        elif name == "max_pressure":
-            self.traffic_controller.set_controller(MaxPressureController())
-        elif name == "q_learning":
-            self.traffic_controller.set_controller(QTableController("q_table_advanced.json"))
-        else:
-            self.traffic_controller.set_controller(ActuatedThresholdController())
-            self.controller_name = "actuated"
+        self.core.apply_controller(name)
 
     def reset(self):
-        self.traffic_controller = TrafficController()
-        self._apply_controller(self.controller_name)
-        self.car_manager = CarManager()
-        self.last_spawn_time = 0
-        self.current_time = 0
+        self.core.reset()
         self.running = False
         self.spawn_rate = 2.0
         self.speed_multiplier = 1.0
 
     def update(self, delta_time: float):
-        self.current_time += delta_time
-
-        if self.current_time - self.last_spawn_time > self.spawn_rate * 1000 + random.random() * 1000:
-            direction = random.choice(list(Direction))
-            self.car_manager.spawn_car(direction)
-            self.last_spawn_time = self.current_time
-
-        queue_stats = {d: self.car_manager.get_queue_count(d) for d in Direction}
-        vip_queue_stats = {d: self.car_manager.get_vip_queue_count(d) for d in Direction}
-
-        self.traffic_controller.update(queue_stats, vip_queue_stats, delta_time)
-        self.car_manager.update_cars(
-            lambda d: self.traffic_controller.get_light_state(d),
-            delta_time
-        )
+        self.core.update(delta_time)
 
     def get_state_dict(self) -> dict:
         cars_data = []
-        for car in self.car_manager.get_cars():
+        for car in self.car_manager.iter_cars():
             cars_data.append({
                 'id': car.id,
                 'direction': car.direction.value,
@@ -113,8 +85,9 @@ class SimulationState:
             'phase_time': self.traffic_controller.get_phase_time_remaining(),
             'current_phase': self.traffic_controller.current_phase,
             'controller': self.controller_name,
-            'total_cars': len(self.car_manager.get_cars()),
-            'vip_cars': len([c for c in self.car_manager.get_cars() if c.is_vip]),
+            'policy_version': self.core.policy_version,
+            'total_cars': self.car_manager.get_car_count(),
+            'vip_cars': self.car_manager.get_vip_count(),
             'spawn_rate': self.spawn_rate,
             'speed_multiplier': self.speed_multiplier,
             'running': self.running
@@ -203,6 +176,44 @@ def handle_update_speed(data):
     sim_state.speed_multiplier = max(0.25, min(3.0, speed))
     emit('state_update', sim_state.get_state_dict())
 
+@socketio.on('pin_policy')
+def handle_pin_policy(data):
+    """Pins this session's q_learning policy to a store version, or back to 'latest' ({'version': ...})."""
+    sim_state = get_session_state()
+    store = policy_store.active_store()
+    version = (data or {}).get('version', policy_store.LATEST)
+    if store is None:
+        emit('pin_policy', {'error': 'no policy store configured (set POLICY_DIR)'})
+        return
+    if version != policy_store.LATEST:
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            emit('pin_policy', {'error': f'invalid policy version {version!r}'})
+            return
+        if version not in store.versions():
+            emit('pin_policy', {'error': f'unknown policy version {version}', 'versions': store.versions()})
+            return
+    sim_state.core.controller_params['q_learning'] = {'version': version}
+    if sim_state.controller_name == 'q_learning':
+        sim_state.core.apply_controller('q_learning')
+    emit('pin_policy', {'version': version})
+    emit('state_update', sim_state.get_state_dict())
+
+@socketio.on('profile')
+def handle_profile(data):
+    """Switches tick profiling on/off ({'enabled': bool}) and sends the stage summary."""
+    sim_state = get_session_state()
+    profiler = sim_state.core.profiler
+    enabled = (data or {}).get('enabled')
+    if enabled is True and not profiler.enabled:
+        profiler.reset()
+        profiler.enable()
+    elif enabled is False:
+        profiler.disable()
+    emit('profile', {'enabled': profiler.enabled, 'stages': profiler.summary(),
+                     'decisions': sim_state.traffic_controller.decision_stats()})
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 3003))
     debug = os.environ.get('FLASK_ENV') != 'production'
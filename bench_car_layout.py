@@ -0,0 +1,90 @@
+# bench_car_layout.py
+#
+# Compares the compact slotted Car (models.Car) with the previous plain
+# dataclass layout: memory per car and CarManager.update_cars tick time
+# at 1k and 10k cars.
+#
+# Usage:
+#   python3 bench_car_layout.py
+
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Tuple
+
+from models import Car, Direction, LightState, DIRECTIONS, COLOR_PALETTE
+from car_manager import CarManager
+
+
+# The Car layout before the slotted version, kept here only for comparison
+@dataclass
+class LegacyCar:
+    id: str
+    direction: Direction
+    position: float
+    speed: float
+    committed: bool
+    color: Tuple[int, int, int]
+    is_vip: bool = False
+    spawn_time: float = 0.0
+
+
+CAR_COUNTS = [1_000, 10_000]
+TICKS = 50
+
+
+def make_cars(kind: str, n: int) -> list:
+    rng = random.Random(0)
+    cars = []
+    for i in range(n):
+        lane = i % 4
+        color_idx = rng.randrange(len(COLOR_PALETTE))
+        if kind == "legacy":
+            cars.append(LegacyCar(f"car-{i}", DIRECTIONS[lane], 0.0, 0.4, False, COLOR_PALETTE[color_idx]))
+        else:
+            cars.append(Car(i, lane, 0.0, 0.4, False, color_idx))
+    return cars
+
+
+def measure_memory(kind: str, n: int) -> float:
+    """Bytes allocated per car while building n cars."""
+    tracemalloc.start()
+    cars = make_cars(kind, n)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cars
+    return current / n
+
+
+def measure_tick(kind: str, n: int) -> float:
+    """Average ms per update_cars call with n cars spread along their lanes."""
+    cm = CarManager()
+    cars = make_cars(kind, n)
+    per_lane = n // 4
+    for i, car in enumerate(cars):
+        # Front of each lane first, spaced so nobody leaves during the run
+        car.position = 590.0 * (1 - (i // 4) / per_lane) - 100
+        cm.lanes[DIRECTIONS[i % 4]].append(car)
+
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        cm.update_cars(lambda d: LightState.RED, 16.67)
+    return (time.perf_counter() - start) / TICKS * 1000
+
+
+def main():
+    print("=" * 60)
+    print("CAR LAYOUT COMPARISON")
+    print("=" * 60)
+    print(f"{'cars':>8} {'layout':>8} {'bytes/car':>10} {'ms/tick':>10}")
+    for n in CAR_COUNTS:
+        for kind in ["legacy", "slotted"]:
+            mem = measure_memory(kind, n)
+            tick = measure_tick(kind, n)
+            print(f"{n:>8} {kind:>8} {mem:>10.0f} {tick:>10.2f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
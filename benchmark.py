@@ -0,0 +1,282 @@
+# benchmark.py
+#
+# Benchmark suite with fixed seeds:
+#   update_cars   ticks/s of CarManager.update_cars (both engines) at 10 to 10k cars
+#   act           ns per act() call for each controller in controllers.py
+#   qtable_load   Q-table load time: JSON and binary from disk, and a cached load
+#   switch        SimulationCore.apply_controller time per controller (registry lookup)
+#   state_dict    SimulationState.get_state_dict time and JSON size (needs app.py's deps)
+#   end_to_end    wall time of a 120 s SimulationCore run per controller
+#
+# Results are saved as JSON and compared with the committed reference run,
+# benchmark_baseline.json (or --baseline); the exit status is 1 if any got
+# worse by more than --threshold. The baseline's meta says which machine it
+# was recorded on: timings from another machine are only roughly comparable,
+# so re-record it there first when checking a change locally.
+#
+# Usage:
+#   python3 benchmark.py
+#   python3 benchmark.py --threshold 0.3 --only act end_to_end
+#   python3 benchmark.py --output benchmark_baseline.json --notes "1 vCPU Xeon, idle"   # re-record
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from models import DIRECTIONS, LightState
+import q_policy
+from controllers import ActuatedThresholdController, MaxPressureController, QTableController
+from lane_engine import ENGINES
+from simulation_core import SimulationCore
+
+
+SEED = 0
+CAR_COUNTS = [10, 100, 1_000, 10_000]
+CONTROLLERS = ["actuated", "max_pressure", "q_learning"]
+Q_TABLE = "q_table_advanced.json"
+Q_TABLE_BINARY = "q_table_advanced.qtab"
+ACT_STATES = 1_000
+E2E_DURATION_S = 120
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+
+def measure(fn: Callable[[], None], min_time: float, rounds: int = 5) -> float:
+    """Seconds per fn() call: the fastest of `rounds` timed rounds, each
+    repeating fn enough times to last about min_time / rounds."""
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / rounds:
+            break
+        calls *= 2
+
+    best = elapsed
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / calls
+
+
+def result(name: str, value: float, unit: str, better: str) -> Dict:
+    return {"name": name, "value": value, "unit": unit, "better": better}
+
+
+# --- Cases ------------------------------------------------------------------------
+def populate(engine: str, n: int):
+    """Car manager with n cars queued back from each red stop line, one per 45 units."""
+    random.seed(SEED)
+    cm = ENGINES[engine]()
+    for i in range(n):
+        cm.spawn_car(DIRECTIONS[i % 4])
+    for lane in cm.lanes.values():
+        count = len(lane) if engine == "python" else lane.n
+        positions = cm.stop_line_position - 10.0 - 45.0 * np.arange(count)
+        if engine == "python":
+            for car, position in zip(lane, positions.tolist()):
+                car.position = position
+        else:
+            lane.position[:count] = positions
+    return cm
+
+
+def bench_update_cars(min_time: float) -> List[Dict]:
+    results = []
+    for engine in ENGINES:
+        for n in CAR_COUNTS:
+            cm = populate(engine, n)
+            per_tick = measure(lambda: cm.update_cars(lambda d: LightState.RED, 16.67), min_time)
+            results.append(result(f"update_cars/{engine}/{n}", 1.0 / per_tick, "ticks/s", "higher"))
+    return results
+
+
+def act_states(count: int = ACT_STATES) -> List[tuple]:
+    """Seeded (qN, qS, qE, qW, phase, green_elapsed_s) inputs for act()."""
+    rng = np.random.default_rng(SEED)
+    queues = rng.integers(0, 15, (count, 4))
+    phases = rng.integers(0, 2, count)
+    elapsed = rng.integers(0, 40, count)
+    return [(*q, p, e) for q, p, e in zip(queues.tolist(), phases.tolist(), elapsed.tolist())]
+
+
+def bench_act(min_time: float) -> List[Dict]:
+    states = act_states()
+    controllers = {
+        "actuated": ActuatedThresholdController(),
+        "max_pressure": MaxPressureController(),
+        "q_learning": QTableController(Q_TABLE),
+    }
+    results = []
+    for name, ctrl in controllers.items():
+        def run_all(act=ctrl.act):
+            for state in states:
+                act(*state)
+        per_call = measure(run_all, min_time) / len(states)
+        results.append(result(f"act/{name}", per_call * 1e9, "ns", "lower"))
+    return results
+
+
+def bench_qtable_load(min_time: float) -> List[Dict]:
+    def cold_load(path):
+        q_policy.clear_cache()
+        QTableController(path)
+
+    results = []
+    for name, path in (("json", Q_TABLE), ("binary", Q_TABLE_BINARY)):
+        if os.path.exists(path):
+            per_load = measure(lambda: cold_load(path), min_time)
+            results.append(result(f"qtable_load/{name}", per_load * 1e3, "ms", "lower"))
+    per_load = measure(lambda: QTableController(Q_TABLE), min_time)
+    results.append(result("qtable_load/cached", per_load * 1e3, "ms", "lower"))
+    return results
+
+
+def bench_switch(min_time: float) -> List[Dict]:
+    sim = SimulationCore()
+    results = []
+    for name in CONTROLLERS:
+        per_switch = measure(lambda: sim.apply_controller(name), min_time)
+        results.append(result(f"switch/{name}", per_switch * 1e6, "us", "lower"))
+    return results
+
+
+def bench_state_dict(min_time: float) -> List[Dict]:
+    """Skipped (empty) when the web server's dependencies are not installed."""
+    try:
+        from app import SimulationState
+    except ImportError as e:
+        print(f"  state_dict skipped: {e}")
+        return []
+
+    # The web app keeps the legacy spawn check, which draws from `random`
+    state = SimulationState()
+    random.seed(SEED)
+    state.core.reset()
+    state.core.run(60)
+    per_call = measure(state.get_state_dict, min_time)
+    size = len(json.dumps(state.get_state_dict()))
+    return [
+        result("state_dict/time", per_call * 1e6, "us", "lower"),
+        result("state_dict/size", size, "bytes", "lower"),
+    ]
+
+
+def bench_end_to_end(min_time: float) -> List[Dict]:
+    results = []
+    for name in CONTROLLERS:
+        best = float("inf")
+        for _ in range(3):
+            random.seed(SEED)
+            sim = SimulationCore(controller_name=name, arrivals="uniform_jitter", seed=SEED)
+            start = time.perf_counter()
+            sim.run(E2E_DURATION_S)
+            best = min(best, time.perf_counter() - start)
+        results.append(result(f"end_to_end/{name}", best, "s", "lower"))
+    return results
+
+
+CASES = {
+    "update_cars": bench_update_cars,
+    "act": bench_act,
+    "qtable_load": bench_qtable_load,
+    "switch": bench_switch,
+    "state_dict": bench_state_dict,
+    "end_to_end": bench_end_to_end,
+}
+
+
+# --- Baseline comparison ---------------------------------------------------------
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> List[str]:
+    """Prints each result against the baseline; returns the names that regressed.
+
+    A result regressed if it is more than `threshold` (0.2 = 20%) worse:
+    slower for "lower" results, lower throughput for "higher" ones.
+    """
+    previous = {r["name"]: r for r in baseline}
+    regressions = []
+    print(f"\n{'benchmark':<28}{'baseline':>14}{'current':>14}{'change':>10}")
+    for r in results:
+        base = previous.get(r["name"])
+        if base is None or not base["value"]:
+            print(f"{r['name']:<28}{'-':>14}{r['value']:>14.4g}")
+            continue
+        change = r["value"] / base["value"] - 1.0
+        worse = change if r["better"] == "lower" else base["value"] / r["value"] - 1.0
+        flag = ""
+        if worse > threshold:
+            regressions.append(r["name"])
+            flag = "  REGRESSION"
+        print(f"{r['name']:<28}{base['value']:>14.4g}{r['value']:>14.4g}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation, controller and serialization benchmarks.")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to save the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help=f"results file to compare with (default {DEFAULT_BASELINE})")
+    parser.add_argument("--no-baseline", action="store_true", help="skip the baseline comparison")
+    parser.add_argument("--notes", default="", help="machine notes saved in the results' meta")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown vs the baseline before failing (default 0.2 = 20%%)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent timing each case")
+    parser.add_argument("--only", nargs="+", choices=list(CASES), help="run only these cases")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("BENCHMARKS")
+    print("=" * 60)
+    results = []
+    for name in args.only or CASES:
+        print(f"Running {name}...", flush=True)
+        results.extend(CASES[name](args.min_time))
+
+    for r in results:
+        print(f"  {r['name']:<28}{r['value']:>14.4g} {r['unit']}")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "cpus": os.cpu_count(),
+            "notes": args.notes,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {args.output}")
+
+    if args.no_baseline or os.path.abspath(args.baseline) == os.path.abspath(args.output):
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; record one with --output {args.baseline}")
+        sys.exit(1)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"]["platform"] != report["meta"]["platform"]:
+        print("Note: baseline was recorded on a different platform")
+    print(f"Baseline: {baseline['meta']['time']}, {baseline['meta'].get('notes') or 'no notes'}")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
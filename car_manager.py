@@ -1,71 +1,206 @@
 # car_manager.py
+import math
 import random
-from typing import List, Dict
+from collections import deque
+from typing import Iterator, List, Dict, Deque, Tuple, Optional
 
-from models import Car, Direction, LightState
+import numpy as np
+
+import models
+from coasting import coast_lanes
+from models import Car, Direction, LightState, DIRECTION_INDEX
+from wait_stats import WaitTimeStats
 
 
 class CarManager:
-    # Regular car colors
-    CAR_COLORS = [
-        (59, 130, 246),
-        (239, 68, 68),
-        (16, 185, 129),
-        (245, 158, 11),
-        (139, 92, 246),
-        (236, 72, 153)
-    ]
-
-    # Special colors for VIP/emergency cars
-    VIP_COLORS = [
-        (255, 255, 255),    # white
-        (0, 200, 255),      # bright blue
-        (255, 0, 0)         # red
-    ]
+    # Car colors (see models.COLOR_PALETTE)
+    CAR_COLORS = models.CAR_COLORS
+    VIP_COLORS = models.VIP_COLORS
+
+    # Palette indices for each group
+    CAR_COLOR_IDX = range(0, len(CAR_COLORS))
+    VIP_COLOR_IDX = range(len(CAR_COLORS), len(CAR_COLORS) + len(VIP_COLORS))
 
     VIP_SPAWN_PROB = 0.03  # probability of a random VIP spawn
 
-    def __init__(self):
-        self.cars: List[Car] = []
+    # Speed relaxation time constant (ms) for the "continuous" integrator.
+    # Matches the "tick" integrator's 10% per 16.67 ms step.
+    SPEED_TAU = -16.67 / math.log(0.9)
+
+    INTEGRATORS = ("tick", "continuous")
+
+    # Default lane: spawn at 0, stop line at 290, intersection ends at 450,
+    # cars leave at 600. A longer lane extends the approach before the stop line.
+    DEFAULT_LANE_LENGTH = 600
+    EXIT_AFTER_STOP_LINE = 310
+
+    def __init__(self, debug: bool = False, integrator: str = "tick", recorder=None,
+                 lane_length: float = DEFAULT_LANE_LENGTH):
+        # One deque per lane, front car first. Cars never overtake and always
+        # spawn at position 0, so appending keeps each lane ordered by position.
+        self.lanes: Dict[Direction, Deque[Car]] = {d: deque() for d in Direction}
         self.next_id = 0
-        self.completed_cars: List[tuple] = []
+        self.wait_stats = WaitTimeStats()  # wait times of finished cars
 
-        self.stop_line_position = 290
-        self.intersection_end = 450
+        if lane_length <= self.EXIT_AFTER_STOP_LINE:
+            raise ValueError(f"lane_length must be > {self.EXIT_AFTER_STOP_LINE}, got {lane_length}")
+        self.lane_length = lane_length                  # cars leave here
+        self.stop_line_position = lane_length - self.EXIT_AFTER_STOP_LINE
+        self.intersection_end = lane_length - 150
         self.max_speed = 0.4
         self.min_distance = 40
 
-    def spawn_car(self, direction: Direction, force_vip: bool = False, current_time: float = 0.0) -> None:
-        is_vip = force_vip or (random.random() < self.VIP_SPAWN_PROB)
-        color = random.choice(self.VIP_COLORS if is_vip else self.CAR_COLORS)
+        # Waiting cars per direction, updated only when a car spawns, crosses
+        # the stop line, commits or leaves. With debug=True every query is
+        # cross-checked against a full scan of the lane.
+        self.queue_counts: Dict[Direction, int] = {d: 0 for d in Direction}
+        self.vip_queue_counts: Dict[Direction, int] = {d: 0 for d in Direction}
+        self.vip_count = 0
+        self.debug = debug
+
+        # "tick": original per-tick update, only valid around 16 ms steps.
+        # "continuous": exact exponential speed relaxation in real time, plus
+        # clamps so large steps never carry a car through a red stop line or
+        # into the car ahead. Stable at 100-500 ms steps.
+        if integrator not in self.INTEGRATORS:
+            raise ValueError(f"unknown integrator {integrator!r}, expected one of {self.INTEGRATORS}")
+        self.integrator = integrator
+
+        # Optional trajectory.TrajectoryRecorder; None records nothing
+        self.recorder = recorder
+
+    def _relaxation(self, delta_time: float) -> Tuple[float, float]:
+        """(speed decay, distance factor) of the continuous integrator for one step.
+
+        Over a step with constant target speed v*, a speed v relaxes to
+        v* + (v - v*) * decay while travelling v* * dt + (v - v*) * factor.
+        """
+        decay = math.exp(-delta_time / self.SPEED_TAU)
+        return decay, self.SPEED_TAU * (1.0 - decay)
+
+    def spawn_car(self, direction: Direction, force_vip: bool = False, current_time: float = 0.0,
+                  color_idx: Optional[int] = None) -> None:
+        # Pre-drawn arrivals (see arrivals.py) pass color_idx and their VIP flag
+        # as force_vip, so no random numbers are drawn here.
+        if color_idx is not None:
+            is_vip = force_vip
+        else:
+            is_vip = force_vip or (random.random() < self.VIP_SPAWN_PROB)
+            color_idx = random.choice(self.VIP_COLOR_IDX if is_vip else self.CAR_COLOR_IDX)
 
         car = Car(
-            id=f"car-{self.next_id}",
-            direction=direction,
+            id=self.next_id,
+            lane=DIRECTION_INDEX[direction],
             position=0.0,
             speed=self.max_speed,
             committed=False,
-            color=color,
+            color_idx=color_idx,
             is_vip=is_vip,
             spawn_time=current_time
         )
 
         self.next_id += 1
-        self.cars.append(car)
+        self.lanes[direction].append(car)
+
+        # A new car always starts behind the stop line
+        self.queue_counts[direction] += 1
+        if is_vip:
+            self.vip_queue_counts[direction] += 1
+            self.vip_count += 1
+
+    @property
+    def cars(self) -> List[Car]:
+        """A new list on every access; loops should use iter_cars()."""
+        return self.get_cars()
 
     def update_cars(self, get_light_state, delta_time: float, current_time: float = 0.0) -> None:
-        cars_by_direction = self._group_cars_by_direction()
+        relaxation = self._relaxation(delta_time) if self.integrator == "continuous" else None
+
+        for direction, lane in self.lanes.items():
+            if not lane:
+                continue
+            light_state = get_light_state(direction)
+            queue_delta, vip_delta = self._update_lane(lane, light_state, delta_time, relaxation)
+            self.queue_counts[direction] += queue_delta
+            self.vip_queue_counts[direction] += vip_delta
+
+            # Finished cars are always at the front of the lane (and past the stop line)
+            while lane and lane[0].position >= self.lane_length:
+                car = lane.popleft()
+                self.wait_stats.add(current_time - car.spawn_time, car.is_vip)
+                if car.is_vip:
+                    self.vip_count -= 1
+
+        if self.recorder is not None and self.recorder.sample():
+            self._record_trajectories(current_time)
+
+    def coast(self, get_light_state, delta_time: float, max_ticks: int) -> int:
+        """Advances every car by up to max_ticks ticks in one go, stopping
+        before the first tick where a queue would change, a car would leave
+        or change how it moves (see coasting.py). Returns the ticks advanced:
+        all of them on an empty road, none with the continuous integrator or
+        while recording trajectories."""
+        lanes = []
+        for direction in self.lanes:
+            position, speed, committed = self._lane_arrays(direction)
+            if len(position):
+                lanes.append((direction, get_light_state(direction), position, speed, committed))
+        if not lanes:
+            return max_ticks
+        if self.integrator != "tick" or self.recorder is not None:
+            return 0
+
+        ticks, states = coast_lanes(self, [lane[1:] for lane in lanes], delta_time, max_ticks)
+        for lane, state in zip(lanes, states):
+            self._set_lane_arrays(lane[0], *state)
+        return ticks
+
+    def _lane_arrays(self, direction: Direction) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(position, speed, committed) of a lane's cars, front first."""
+        lane = self.lanes[direction]
+        return (np.array([car.position for car in lane], dtype=float),
+                np.array([car.speed for car in lane], dtype=float),
+                np.array([car.committed for car in lane], dtype=bool))
+
+    def _set_lane_arrays(self, direction: Direction, position: np.ndarray, speed: np.ndarray,
+                         committed: np.ndarray) -> None:
+        for car, p, s, c in zip(self.lanes[direction], position.tolist(), speed.tolist(), committed.tolist()):
+            car.position, car.speed, car.committed = p, s, c
 
-        for car in self.cars:
-            light_state = get_light_state(car.direction)
+    def _record_trajectories(self, current_time: float) -> None:
+        """Writes one trajectory record per car on the road."""
+        for lane in self.lanes.values():
+            self.recorder.write_cars(current_time, lane)
 
-            # Look for the next car ahead in the same lane
-            cars_ahead = [
-                c for c in cars_by_direction[car.direction]
-                if c.position > car.position and c.position - car.position < 100
-            ]
-            cars_ahead.sort(key=lambda c: c.position)
-            nearest_car_ahead = cars_ahead[0] if cars_ahead else None
+    def _update_lane(self, lane: Deque[Car], light_state: LightState, delta_time: float,
+                     relaxation: Optional[Tuple[float, float]] = None) -> Tuple[int, int]:
+        """Moves the cars of one lane, front to back.
+
+        relaxation comes from _relaxation() for the continuous integrator,
+        None for the tick integrator.
+        Returns the change in (queue count, VIP queue count) for the lane.
+        """
+        stop_line = self.stop_line_position
+        queue_delta = 0
+        vip_delta = 0
+
+        prev = None     # car just updated (directly ahead in the lane)
+        leader = None   # nearest car strictly ahead of the previous car
+
+        for car in lane:
+            was_waiting = car.position <= stop_line and not car.committed
+            start_position = car.position
+            stop_pos = None
+
+            # The car ahead is the previous one, unless both share a position
+            if prev is not None and prev.position > car.position:
+                leader = prev
+            elif leader is not None and leader.position <= car.position:
+                leader = None
+
+            nearest_car_ahead = None
+            if leader is not None and leader.position - car.position < 100:
+                nearest_car_ahead = leader
 
             # Mark car as committed once past the intersection
             if car.position >= self.intersection_end:
@@ -106,42 +241,48 @@ class CarManager:
                     if distance_to_stop < 80:
                         target_speed = min(target_speed, distance_to_stop / 10.0)
 
-            car.speed += (target_speed - car.speed) * 0.1
-            car.position += car.speed * delta_time
+            if relaxation is None:
+                car.speed += (target_speed - car.speed) * 0.1
+                car.position += car.speed * delta_time
+            else:
+                decay, factor = relaxation
+                offset = car.speed - target_speed
+                car.position += target_speed * delta_time + offset * factor
+                car.speed = target_speed + offset * decay
+
+                # A large step must not carry the car through a red stop line...
+                if stop_pos is not None and car.position > stop_pos:
+                    car.position = stop_pos
+                    car.speed = 0.0
+
+                # ...or into the car ahead (whatever the lookahead distance)
+                if prev is not None and car.position > prev.position - self.min_distance:
+                    car.position = max(prev.position - self.min_distance, start_position)
+                    car.speed = min(car.speed, prev.speed)
+
+            # Crossing the stop line, committing, or being held back behind it
+            waiting = car.position <= stop_line and not car.committed
+            if waiting != was_waiting:
+                step = 1 if waiting else -1
+                queue_delta += step
+                if car.is_vip:
+                    vip_delta += step
 
-        completed = [c for c in self.cars if c.position >= 600]
-        for car in completed:
-            wait_time = current_time - car.spawn_time
-            self.completed_cars.append((wait_time, car.is_vip))
-        self.cars = [c for c in self.cars if c.position < 600]
+            prev = car
 
-    def _group_cars_by_direction(self) -> Dict[Direction, List[Car]]:
-        """Groups cars by the direction of their lane."""
-        return {
-            Direction.NORTH: [c for c in self.cars if c.direction == Direction.NORTH],
-            Direction.SOUTH: [c for c in self.cars if c.direction == Direction.SOUTH],
-            Direction.EAST:  [c for c in self.cars if c.direction == Direction.EAST],
-            Direction.WEST:  [c for c in self.cars if c.direction == Direction.WEST]
-        }
+        return queue_delta, vip_delta
 
     def get_queue_count(self, direction: Direction) -> int:
         """Counts cars waiting before the stop line."""
-        return len([
-            c for c in self.cars
-            if c.direction == direction and
-               c.position <= self.stop_line_position and
-               not c.committed
-        ])
+        if self.debug:
+            self._check_counters(direction)
+        return self.queue_counts[direction]
 
     def get_vip_queue_count(self, direction: Direction) -> int:
         """Counts VIP/emergency vehicles waiting before the stop line."""
-        return len([
-            c for c in self.cars
-            if c.direction == direction and
-               c.is_vip and
-               c.position <= self.stop_line_position and
-               not c.committed
-        ])
+        if self.debug:
+            self._check_counters(direction)
+        return self.vip_queue_counts[direction]
 
     def get_vip_directions_waiting(self) -> List[Direction]:
         """Returns a list of directions where VIP cars are currently waiting."""
@@ -150,14 +291,58 @@ class CarManager:
             if self.get_vip_queue_count(d) > 0
         ]
 
+    def get_car_count(self) -> int:
+        """Number of active cars."""
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def get_vip_count(self) -> int:
+        """Number of active VIP/emergency cars."""
+        return self.vip_count
+
+    def _scan_queue_counts(self, direction: Direction) -> Tuple[int, int]:
+        """Recounts (waiting, waiting VIP) cars of a lane from scratch."""
+        waiting = [
+            c for c in self.lanes[direction]
+            if c.position <= self.stop_line_position and not c.committed
+        ]
+        return len(waiting), sum(1 for c in waiting if c.is_vip)
+
+    def _check_counters(self, direction: Direction) -> None:
+        expected = self._scan_queue_counts(direction)
+        actual = (self.queue_counts[direction], self.vip_queue_counts[direction])
+        if actual != expected:
+            raise AssertionError(
+                f"queue counters out of sync for {direction.value}: "
+                f"counted {actual}, scan found {expected}"
+            )
+
     def get_cars(self) -> List[Car]:
         """Returns the current list of active cars."""
-        return self.cars
+        return list(self.iter_cars())
+
+    def iter_cars(self) -> Iterator[Car]:
+        """The active cars lane by lane, without copying them into a list.
+        Don't spawn or update while iterating."""
+        for lane in self.lanes.values():
+            yield from lane
 
     def clear_cars(self) -> None:
-        self.cars = []
+        for lane in self.lanes.values():
+            lane.clear()
+        self.queue_counts = {d: 0 for d in Direction}
+        self.vip_queue_counts = {d: 0 for d in Direction}
+        self.vip_count = 0
 
     def get_avg_wait_time(self) -> float:
-        if not self.completed_cars:
-            return 0.0
-        return sum(wt for wt, _ in self.completed_cars) / len(self.completed_cars)
+        return self.wait_stats.mean()
+
+    def get_wait_time_stats(self, vip: Optional[bool] = None) -> Dict[str, float]:
+        """count/mean/variance/std/max and approximate p50/p95/p99 of wait times (ms).
+
+        vip=True for VIP cars only, False for regular cars only, None for all.
+        """
+        return self.wait_stats.summary(vip)
+
+    def get_wait_time_percentile(self, q: float, vip: Optional[bool] = None) -> float:
+        """Approximate q-quantile (0..1) of wait times (ms)."""
+        return self.wait_stats.sketch(vip).quantile(q)
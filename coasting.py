@@ -0,0 +1,179 @@
+# coasting.py
+#
+# Multi-tick car updates for fast-forward (SimulationCore.run(fast_forward=True)).
+#
+# Between events every car's tick update is a fixed recurrence: either it is
+# held at its red stop position (position reset, speed decaying to 0), or its
+# target speed stays the same (max speed, half speed behind a close leader,
+# 0 behind a stopped one) and its speed relaxes toward it. The first tick
+# picks each car's regime; the whole span is then replayed as (ticks, cars)
+# arrays with the same float operations as CarManager._update_lane (a speed
+# loop per car, np.add.accumulate for positions, which adds in order), so a
+# coasted span ends bit-identical to stepping it tick by tick.
+#
+# The span stops before the first tick where any car would change regime,
+# cross or commit at the stop line (a queue changes) or leave the road.
+# Only the "tick" integrator coasts.
+
+from typing import List, Tuple
+
+import numpy as np
+
+from models import LightState
+
+
+# How far ahead a car looks for a leader (same constant as CarManager._update_lane)
+LOOKAHEAD = 100
+
+LaneState = Tuple[np.ndarray, np.ndarray, np.ndarray]   # position, speed, committed (front first)
+
+
+def relax_speeds(out: np.ndarray, speed: float, target: float) -> None:
+    """Fills `out` with the speed before each tick (and after the last),
+    relaxing toward target."""
+    speeds = [speed]
+    for _ in range(len(out) - 1):
+        new = speed + (target - speed) * 0.1
+        if new == speed:    # rounding has settled it: it never moves again
+            break
+        speed = new
+        speeds.append(speed)
+    out[:len(speeds)] = speeds
+    out[len(speeds):] = speed
+
+
+def _first_tick(cm, position: float, speed: float, committed: bool, lead, green: bool, stopping: bool,
+                delta_time: float):
+    """One car's tick as in CarManager._update_lane, on plain floats. `lead` is
+    the car ahead's new position (None for the front car). Returns (held,
+    target speed, held behind the car ahead, new position, new speed,
+    committed after)."""
+    stop_line = cm.stop_line_position
+    committed = committed or position >= cm.intersection_end or (green and position >= stop_line)
+    target = cm.max_speed
+    stop_pos = stop_line
+    near = lead is not None and lead - position < LOOKAHEAD
+    if near:
+        gap = lead - position
+        if gap < cm.min_distance:
+            target = 0.0
+        elif gap < cm.min_distance * 2:
+            target = cm.max_speed * 0.5
+        stop_pos = min(stop_line, lead - cm.min_distance)
+
+    held = False
+    if stopping and not committed:
+        if position >= stop_pos:
+            held = True
+            position = stop_pos
+            target = 0.0
+        elif stop_pos - position < 80:
+            target = min(target, (stop_pos - position) / 10.0)
+
+    speed = speed + (target - speed) * 0.1
+    return held, target, near, position + speed * delta_time, speed, committed
+
+
+def _targets(cm, before: np.ndarray, committed: np.ndarray, lead: np.ndarray, stopping: np.ndarray):
+    """(target speed, at stop, stop position) per tick and car, as _first_tick
+    decides them. `before` are positions at the start of each tick,
+    `committed` the flags after that tick's commit check, `lead` the car
+    ahead's new positions (inf for a front car)."""
+    stop_line = cm.stop_line_position
+    gap = lead - before
+    near = gap < LOOKAHEAD
+    target = np.full(before.shape, cm.max_speed)
+    target[near & (gap < cm.min_distance * 2)] = cm.max_speed * 0.5
+    target[near & (gap < cm.min_distance)] = 0.0
+    stop_pos = np.where(near, np.minimum(stop_line, lead - cm.min_distance), float(stop_line))
+
+    must_stop = stopping & ~committed
+    at_stop = must_stop & (before >= stop_pos)
+    distance = stop_pos - before
+    approach = must_stop & ~at_stop & (distance < 80)
+    target = np.where(approach, np.minimum(target, distance / 10.0), target)
+    target[at_stop] = 0.0
+    return target, at_stop, stop_pos
+
+
+def coast_lanes(cm, lanes: List[Tuple[LightState, np.ndarray, np.ndarray, np.ndarray]], delta_time: float,
+                ticks: int) -> Tuple[int, List[LaneState]]:
+    """Coasts every lane (light state, then position / speed / committed
+    arrays, front first) by the same number of ticks, at most `ticks`.
+    Returns (ticks coasted, state of each lane after them)."""
+    stop_line = cm.stop_line_position
+
+    # One column per car, leaders before followers
+    p0, s0, c0, leader, held, target, near = [], [], [], [], [], [], []
+    green, stopping, sizes = [], [], []
+    for light_state, position, speed, committed in lanes:
+        is_green = light_state == LightState.GREEN
+        is_stopping = light_state in (LightState.RED, LightState.YELLOW)
+        lead = None
+        for p, s, c in zip(position.tolist(), speed.tolist(), committed.tolist()):
+            if lead is not None and lead <= p:
+                return 0, []    # CarManager's leader would not be the car ahead
+            car_held, car_target, car_near, new_p, _, new_c = _first_tick(
+                cm, p, s, c, lead, is_green, is_stopping, delta_time)
+            if (p <= stop_line and not c) != (new_p <= stop_line and not new_c) or new_p >= cm.lane_length:
+                return 0, []    # a queue changes or the car leaves on the first tick
+            leader.append(len(p0) - 1 if lead is not None else -1)
+            p0.append(p)
+            s0.append(s)
+            c0.append(c)
+            held.append(car_held)
+            target.append(car_target)
+            near.append(car_near)
+            green.append(is_green)
+            stopping.append(is_stopping)
+            lead = new_p
+        sizes.append(len(position))
+
+    n = len(p0)
+    held = np.array(held)
+    leader = np.array(leader)
+    has_leader = leader >= 0
+    S = np.empty((n, ticks + 1))
+    for k in range(n):
+        relax_speeds(S[k], s0[k], 0.0 if held[k] else target[k])
+    S = S.T
+    moved = S[1:] * delta_time
+
+    # Relaxing cars just move; held ones sit at a stop position that may
+    # follow the car ahead (itself coasted first)
+    P = np.empty((ticks + 1, n))
+    P[0] = p0
+    P[1:] = moved
+    P[:, ~held] = np.add.accumulate(P[:, ~held], axis=0)
+    held_at = np.full((ticks, n), float(stop_line))
+    for k in np.flatnonzero(held).tolist():
+        if near[k]:
+            held_at[:, k] = np.minimum(stop_line, P[1:, leader[k]] - cm.min_distance)
+        P[1:, k] = held_at[:, k] + moved[:, k]
+
+    before, after = P[:-1], P[1:]
+    lead = np.where(has_leader, after[:, np.maximum(leader, 0)], np.inf)
+    green = np.array(green)
+    c0 = np.array(c0)
+    hit = (before >= cm.intersection_end) | (green & (before >= stop_line))
+    C = np.empty((ticks + 1, n), dtype=bool)
+    C[0] = c0
+    C[1:] = c0 | np.logical_or.accumulate(hit, axis=0)
+    car_target, at_stop, stop_pos = _targets(cm, before, C[1:], lead, np.array(stopping))
+
+    ok = np.where(held, at_stop & (stop_pos == held_at), ~at_stop & (car_target == np.array(target)))
+    ok &= lead > before
+    ok &= ((before <= stop_line) & ~C[:-1]) == ((after <= stop_line) & ~C[1:])
+    ok &= after < cm.lane_length
+    quiet_rows = ok.all(axis=1)
+    quiet = ticks if quiet_rows.all() else int(np.argmin(quiet_rows))
+    if quiet == 0:
+        return 0, []
+
+    states = []
+    start = 0
+    for size in sizes:
+        columns = slice(start, start + size)
+        states.append((P[quiet, columns], S[quiet, columns], C[quiet, columns]))
+        start += size
+    return quiet, states
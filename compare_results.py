@@ -1,20 +1,22 @@
-import glob
 import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
+from metrics import window_quantile
+from metrics_io import find_metric_files, load_metrics, load_run_events, metric_name
+from phase_log import summarize_events
+
 os.makedirs("results", exist_ok=True)
 
-all_files = sorted(glob.glob("metrics/metrics_*.csv"))
+all_files = find_metric_files("metrics/metrics_*")
 FILES = [f for f in all_files if not any(x in f for x in ["_light", "_normal", "_heavy"])]
 
 if not FILES:
-    raise FileNotFoundError("No metrics/metrics_*.csv found. Run generate_metrics.py first.")
+    raise FileNotFoundError("No metrics/metrics_* files found. Run generate_metrics.py first.")
 
 def pretty(path: str) -> str:
-    base = os.path.splitext(os.path.basename(path))[0]
-    return base.replace("metrics_", "").replace("_", " ").title()
+    return metric_name(path).replace("metrics_", "").replace("_", " ").title()
 
 def find_col(df: pd.DataFrame, candidates: list) -> str:
     for c in candidates:
@@ -27,11 +29,21 @@ def safe_val(df: pd.DataFrame, col: str, func):
         return None
     return func(df[col])
 
-dfs = {f: pd.read_csv(f) for f in FILES}
+dfs = {f: load_metrics(f) for f in FILES}
 
 TIME_COLS = ["time_s", "time", "t", "seconds"]
-TOTAL_QUEUE_COLS = ["total_queue", "queue_total", "totalQueue", "queue"]
-VIP_QUEUE_COLS = ["vip_queue", "queue_vip", "vipQueue"]
+TOTAL_QUEUE_COLS = ["total_queue", "queue_total", "totalQueue", "queue", "total_queue_mean"]
+VIP_QUEUE_COLS = ["vip_queue", "queue_vip", "vipQueue", "vip_queue_mean"]
+
+def is_windowed(df: pd.DataFrame) -> bool:
+    """Rows are sampling windows (sample_interval_ms), not single ticks."""
+    return "ticks" in df.columns
+
+def tick_mean(df: pd.DataFrame, col: str) -> float:
+    """Per-tick mean of a queue column in either format."""
+    if is_windowed(df):
+        return np.average(df[f"{col}_mean"], weights=df["ticks"])
+    return df[col].mean()
 WAIT_COLS = ["avg_wait", "avg_wait_s", "mean_wait_s"]
 
 plt.figure(figsize=(10, 6))
@@ -83,12 +95,32 @@ for f, df in dfs.items():
         "duration_s": safe_val(df, tcol, lambda x: x.iloc[-1] if len(x) > 0 else 0)
     }
 
-    if "phase" in df.columns:
-        switches = (df["phase"] != df["phase"].shift()).sum() - 1
-        row["total_switches"] = max(0, switches)
-
-    if qcol and tcol:
-        row["cumulative_queue"] = np.trapezoid(df[qcol], df[tcol])
+    if is_windowed(df):
+        # Window aggregates keep these exact; p95 comes from the window maxima (an upper bound)
+        row["avg_total_queue"] = tick_mean(df, "total_queue")
+        row["p95_total_queue"] = window_quantile(df["total_queue_max"], df["ticks"], 0.95)
+        row["max_total_queue"] = df["total_queue_max"].max()
+        row["avg_vip_queue"] = tick_mean(df, "vip_queue")
+        row["total_switches"] = df["switches"].sum()
+        row["cumulative_queue"] = df["total_queue_int"].sum()
+    else:
+        if "phase" in df.columns:
+            switches = (df["phase"] != df["phase"].shift()).sum() - 1
+            row["total_switches"] = max(0, switches)
+
+        if qcol and tcol:
+            row["cumulative_queue"] = np.trapezoid(df[qcol], df[tcol])
+
+    # The signal's event log, when saved next to the metrics, gives exact
+    # switch counts plus green times and VIP preemption stats
+    events = load_run_events(f)
+    if events is not None:
+        end_ms = (row["duration_s"] or 0) * 1000
+        ev = summarize_events(events, end_time=end_ms)
+        row["total_switches"] = ev["switches"]
+        row["avg_green_s"] = ev["avg_green_s"]
+        row["preemptions"] = ev["preemptions"]
+        row["avg_preempt_latency_s"] = ev["avg_preempt_latency_s"]
 
     rows.append(row)
 
@@ -139,7 +171,9 @@ if "total_switches" in summary.columns:
 plt.figure(figsize=(10, 6))
 for f, df in dfs.items():
     tcol = find_col(df, TIME_COLS)
-    if tcol and "phase" in df.columns:
+    if tcol and is_windowed(df):
+        plt.plot(df[tcol], df["switches"].cumsum(), label=pretty(f), linewidth=2)
+    elif tcol and "phase" in df.columns:
         switches = (df["phase"] != df["phase"].shift()).cumsum()
         plt.plot(df[tcol], switches, label=pretty(f), linewidth=2)
 
@@ -207,19 +241,20 @@ plt.tight_layout()
 plt.savefig("results/queue_boxplots.png", dpi=200)
 plt.close()
 
-has_per_direction = any("qN" in df.columns for df in dfs.values())
+has_per_direction = any("qN" in df.columns or "qN_mean" in df.columns for df in dfs.values())
 
 if has_per_direction:
     direction_stats = []
     for f, df in dfs.items():
-        if all(col in df.columns for col in ["qN", "qS", "qE", "qW"]):
+        if all(col in df.columns for col in ["qN", "qS", "qE", "qW"]) or is_windowed(df):
+            means = [tick_mean(df, col) for col in ["qN", "qS", "qE", "qW"]]
             direction_stats.append({
                 "controller": pretty(f),
-                "avg_north": df["qN"].mean(),
-                "avg_south": df["qS"].mean(),
-                "avg_east": df["qE"].mean(),
-                "avg_west": df["qW"].mean(),
-                "std_dev": np.std([df["qN"].mean(), df["qS"].mean(), df["qE"].mean(), df["qW"].mean()])
+                "avg_north": means[0],
+                "avg_south": means[1],
+                "avg_east": means[2],
+                "avg_west": means[3],
+                "std_dev": np.std(means)
             })
 
     if direction_stats:
@@ -247,19 +282,20 @@ if has_per_direction:
         plt.close()
 
         for f, df in dfs.items():
-            if all(col in df.columns for col in ["qN", "qS", "qE", "qW", "time_s"]):
+            suffix = "_mean" if is_windowed(df) else ""
+            if all(col + suffix in df.columns for col in ["qN", "qS", "qE", "qW"]) and "time_s" in df.columns:
                 fig, ax = plt.subplots(figsize=(12, 6))
-                ax.plot(df["time_s"], df["qN"], label='North', linewidth=2)
-                ax.plot(df["time_s"], df["qS"], label='South', linewidth=2)
-                ax.plot(df["time_s"], df["qE"], label='East', linewidth=2)
-                ax.plot(df["time_s"], df["qW"], label='West', linewidth=2)
+                ax.plot(df["time_s"], df["qN" + suffix], label='North', linewidth=2)
+                ax.plot(df["time_s"], df["qS" + suffix], label='South', linewidth=2)
+                ax.plot(df["time_s"], df["qE" + suffix], label='East', linewidth=2)
+                ax.plot(df["time_s"], df["qW" + suffix], label='West', linewidth=2)
                 ax.set_xlabel('Time (s)', fontsize=12)
                 ax.set_ylabel('Queue Length', fontsize=12)
                 ax.set_title(f'{pretty(f)}: Per-Direction Queues Over Time', fontsize=14, fontweight='bold')
                 ax.legend()
                 ax.grid(True, alpha=0.3)
                 plt.tight_layout()
-                fname = os.path.basename(f).replace("metrics_", "").replace(".csv", "")
+                fname = metric_name(f).replace("metrics_", "")
                 plt.savefig(f"results/direction_{fname}.png", dpi=200)
                 plt.close()
 
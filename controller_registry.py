@@ -0,0 +1,135 @@
+# controller_registry.py
+#
+# Process-wide registry of decision controllers. Policies (the objects with
+# decide()/act_batch(), see controllers.py) are created once per name and
+# parameters and shared; each simulation only gets a ControllerSession
+# holding its own last_reason. With hundreds of web sessions on the
+# q_learning controller there is still one QTableController in the process,
+# and switching controllers is a dictionary lookup.
+#
+# Built-in controllers: actuated, max_pressure, q_learning. Other packages
+# add theirs through the "traffic_lights.controllers" entry point group; the
+# entry point's name is the controller name and it loads a factory (usually
+# the class) called with the policy parameters:
+#
+#   [project.entry-points."traffic_lights.controllers"]
+#   fuzzy = "my_package.fuzzy:FuzzyController"
+#
+# Usage:
+#   from controller_registry import create_session, get_policy
+#   traffic_controller.set_controller(create_session("q_learning"))
+#   policy = get_policy("max_pressure", params=MaxPressureParams(hysteresis_margin=3))
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from controllers import ActuatedThresholdController, MaxPressureController, QTableController
+
+
+ENTRY_POINT_GROUP = "traffic_lights.controllers"
+DEFAULT_CONTROLLER = "actuated"
+
+_factories: Dict[str, Callable[..., Any]] = {
+    "actuated": ActuatedThresholdController,
+    "max_pressure": MaxPressureController,
+    "q_learning": QTableController,
+}
+# (name, sorted params) -> shared policy
+_policies: Dict[Tuple, Any] = {}
+# name -> factory(**params) building the session itself (see register_sessions)
+_session_factories: Dict[str, Callable[..., Any]] = {}
+_entry_points_loaded = False
+
+
+@dataclass
+class ControllerSession:
+    """Per-simulation side of a shared policy: the TrafficController's
+    decision controller (act / reset / last_reason) for one simulation."""
+    name: str
+    policy: Any
+    last_reason: str = field(default="", init=False)
+
+    @property
+    def deterministic(self) -> bool:
+        return getattr(self.policy, "deterministic", False)
+
+    def reset(self) -> None:
+        self.last_reason = ""
+
+    def act(self, qN: int, qS: int, qE: int, qW: int, phase_val: int, green_elapsed_s: int) -> int:
+        action, self.last_reason = self.policy.decide(qN, qS, qE, qW, phase_val, green_elapsed_s)
+        return action
+
+
+def register(name: str, factory: Callable[..., Any], replace: bool = False) -> None:
+    """Add a controller. factory(**params) must build an object with
+    decide(); it is called once per distinct set of parameters."""
+    name = name.lower()
+    if name in _factories and not replace:
+        raise ValueError(f"controller {name!r} is already registered")
+    _factories[name] = factory
+    for key in [key for key in _policies if key[0] == name]:
+        del _policies[key]
+
+
+def register_sessions(name: str, factory: Optional[Callable[..., Any]]) -> None:
+    """Let `factory(**params)` build the sessions of a controller instead of
+    wrapping its shared policy (policy_store.py uses this to serve
+    versioned Q-tables); None goes back to the shared policy."""
+    name = name.lower()
+    if factory is None:
+        _session_factories.pop(name, None)
+    else:
+        _session_factories[name] = factory
+
+
+def _load_entry_points() -> None:
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+
+    from importlib.metadata import entry_points
+    try:
+        found = entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:   # Python < 3.10
+        found = entry_points().get(ENTRY_POINT_GROUP, [])
+    for ep in found:
+        # Built-ins win over a plugin of the same name
+        if ep.name.lower() not in _factories:
+            _factories[ep.name.lower()] = ep.load()
+
+
+def available() -> List[str]:
+    _load_entry_points()
+    return sorted(_factories)
+
+
+def get_policy(name: str, **params) -> Any:
+    """The shared policy for this controller name and parameters. Treat it
+    as read-only: every simulation using the same name and parameters
+    decides through it."""
+    name = (name or DEFAULT_CONTROLLER).lower()
+    # parameter values must be hashable (the controllers' params dataclasses are frozen)
+    key = (name, tuple(sorted(params.items())))
+    policy = _policies.get(key)
+    if policy is None:
+        if name not in _factories:
+            _load_entry_points()
+        if name not in _factories:
+            raise ValueError(f"unknown controller {name!r} (available: {', '.join(available())})")
+        policy = _policies[key] = _factories[name](**params)
+    return policy
+
+
+def create_session(name: str, **params) -> ControllerSession:
+    name = (name or DEFAULT_CONTROLLER).lower()
+    sessions = _session_factories.get(name)
+    if sessions is not None:
+        return sessions(**params)
+    return ControllerSession(name, get_policy(name, **params))
+
+
+def clear() -> None:
+    """Drop the shared policies, e.g. so the next session loads a retrained Q-table."""
+    _policies.clear()
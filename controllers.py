@@ -2,9 +2,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Optional, Tuple, Dict, Any
-import json
-from ast import literal_eval
+from typing import Optional, Tuple
+import numpy as np
+
+from q_policy import default_policy_path, load_policy
 
 # NOTE: All controllers expose:
 #   - reset()
@@ -12,9 +13,21 @@ from ast import literal_eval
 # where:
 #   phase_val: 0 = NS is green, 1 = EW is green
 #   return: 0 = keep current phase, 1 = switch phase
-
-
-@dataclass
+#
+# Each also exposes act_batch(...) taking NumPy arrays
+# (one entry per simulation replica) and returning an int array of actions.
+# They also set last_reason, a short string saying why act() decided, which
+# TrafficController records in its event log (see phase_log.py).
+#
+# decide(...) takes the same arguments as act() and returns (action, reason)
+# without touching the controller, so one instance can serve any number of
+# simulations; controller_registry.py shares them that way.
+#
+# deterministic = True promises the action and reason depend only on the
+# act() arguments, letting TrafficController reuse earlier decisions.
+
+
+@dataclass(frozen=True)
 class ActuatedThresholdParams:
     # If the opposing axis queue is this much larger than the current axis, request a switch
     imbalance_switch: int = 6
@@ -31,19 +44,26 @@ class ActuatedThresholdController:
     Great 'explainable' baseline (KBS-style rules).
     """
 
+    deterministic = True
+
     def __init__(self, params: Optional[ActuatedThresholdParams] = None):
         self.p = params or ActuatedThresholdParams()
+        self.last_reason = ""   # why the last act() returned its action
 
     def reset(self) -> None:
         pass
 
     def act(self, qN: int, qS: int, qE: int, qW: int, phase_val: int, green_elapsed_s: int) -> int:
+        action, self.last_reason = self.decide(qN, qS, qE, qW, phase_val, green_elapsed_s)
+        return action
+
+    def decide(self, qN: int, qS: int, qE: int, qW: int, phase_val: int, green_elapsed_s: int) -> Tuple[int, str]:
         ns = qN + qS
         ew = qE + qW
 
         # Safety cap
         if green_elapsed_s >= self.p.max_green_s:
-            return 1
+            return 1, "max_green"
 
         if phase_val == 0:  # NS is green
             current = ns
@@ -54,20 +74,33 @@ class ActuatedThresholdController:
 
         # If nobody is waiting anywhere, keep
         if (ns + ew) == 0:
-            return 0
+            return 0, "empty"
 
         # Rule 1: if current axis is empty-ish and other has cars, switch
         if current <= self.p.current_empty_threshold and other >= self.p.opposing_min_to_switch:
-            return 1
+            return 1, "current_empty"
 
         # Rule 2: if other axis is significantly larger, switch
         if (other - current) >= self.p.imbalance_switch:
-            return 1
+            return 1, "imbalance"
 
-        return 0
+        return 0, "keep"
+
+    def act_batch(self, qN, qS, qE, qW, phase_val, green_elapsed_s) -> np.ndarray:
+        """Vectorized act() over arrays of replicas."""
+        ns = qN + qS
+        ew = qE + qW
+        current = np.where(phase_val == 0, ns, ew)
+        other = np.where(phase_val == 0, ew, ns)
+
+        switch = (current <= self.p.current_empty_threshold) & (other >= self.p.opposing_min_to_switch)
+        switch |= (other - current) >= self.p.imbalance_switch
+        switch &= (ns + ew) > 0
+        switch |= green_elapsed_s >= self.p.max_green_s
+        return switch.astype(int)
 
 
-@dataclass
+@dataclass(frozen=True)
 class MaxPressureParams:
     # Hysteresis prevents flicker: require the new phase to beat the current by margin
     hysteresis_margin: int = 2
@@ -81,95 +114,110 @@ class MaxPressureController:
     Switch if opposing pressure exceeds current by hysteresis.
     """
 
+    deterministic = True
+
     def __init__(self, params: Optional[MaxPressureParams] = None):
         self.p = params or MaxPressureParams()
+        self.last_reason = ""   # why the last act() returned its action
 
     def reset(self) -> None:
         pass
 
     def act(self, qN: int, qS: int, qE: int, qW: int, phase_val: int, green_elapsed_s: int) -> int:
+        action, self.last_reason = self.decide(qN, qS, qE, qW, phase_val, green_elapsed_s)
+        return action
+
+    def decide(self, qN: int, qS: int, qE: int, qW: int, phase_val: int, green_elapsed_s: int) -> Tuple[int, str]:
         ns = qN + qS
         ew = qE + qW
 
         if green_elapsed_s >= self.p.max_green_s:
-            return 1
+            return 1, "max_green"
 
         # If nobody is waiting, keep
         if (ns + ew) == 0:
-            return 0
+            return 0, "empty"
 
         # Pressure difference: positive means NS is more 'urgent'
         diff = ns - ew
 
         # If NS green, switch only if EW is significantly more urgent (diff << 0)
         if phase_val == 0:
-            return 1 if (-diff) >= self.p.hysteresis_margin else 0
+            return (1 if (-diff) >= self.p.hysteresis_margin else 0), "pressure"
         # If EW green, switch only if NS is significantly more urgent (diff >> 0)
-        return 1 if diff >= self.p.hysteresis_margin else 0
+        return (1 if diff >= self.p.hysteresis_margin else 0), "pressure"
+
+    def act_batch(self, qN, qS, qE, qW, phase_val, green_elapsed_s) -> np.ndarray:
+        """Vectorized act() over arrays of replicas."""
+        ns = qN + qS
+        ew = qE + qW
+        diff = ns - ew
+
+        switch = np.where(phase_val == 0, -diff, diff) >= self.p.hysteresis_margin
+        switch &= (ns + ew) > 0
+        switch |= green_elapsed_s >= self.p.max_green_s
+        return switch.astype(int)
 
 
 class QTableController:
-    """Loads a trained Q-table (q_table_advanced.json) and chooses actions:
+    """Loads a trained Q-table and chooses actions:
         0 = keep current phase
         1 = switch phase
+
+    The table is a q_policy.QPolicy: dense Q-values indexed by the
+    mixed-radix state, with the greedy action of every state precomputed,
+    so act() is a few integer operations and one list read. States missing
+    from the table have Q-values [0, 0] and keep the phase. Controllers
+    loading the same file share one read-only policy (q_policy.load_policy).
     """
 
-    def __init__(self, q_table_path: str = "q_table_advanced.json"):
-        with open(q_table_path, "r", encoding="utf-8") as f:
-            raw = json.load(f)
+    deterministic = True
 
-        # keys are strings like "(0, 1, 0, 2, 0, 1, -1)"
-        self.Q: Dict[Tuple[Any, ...], list] = {literal_eval(k): v for k, v in raw.items()}
+    def __init__(self, q_table_path: Optional[str] = None):
+        # Binary q_table_advanced.qtab if generated, else q_table_advanced.json
+        self.policy = load_policy(q_table_path or default_policy_path())
+        self.q_values = self.policy.q_values
+        self.actions = self.policy.actions
+        self._greedy = self.policy.greedy
+        self.last_reason = "q_value"   # the action is always the greedy Q-value
 
     def reset(self) -> None:
         pass
 
-    # --- Discretizers must match training (train_q_learning_advanced.py) ---
-    def _discretize_queue(self, q: int) -> int:
-        # MUST match q_learning_env_advanced.py: 0-2->0, 3-5->1, 6+->2
-        if q <= 2:
-            return 0
-        elif q <= 5:
-            return 1
-        else:
-            return 2
-
-    def _discretize_green_steps(self, green_steps: int) -> int:
-        # Your sim passes seconds; training used "steps", but thresholds are same.
-        # Keeping the same buckets as training:
-        if green_steps <= 3:
-            return 0
-        elif green_steps <= 8:
-            return 1
-        else:
-            return 2
-
-    def _discretize_diff(self, diff: int) -> int:
-        # MUST match q_learning_env_advanced.py (EW_total - NS_total):
-        if diff <= -3:
-            return -1
-        elif diff >= 3:
-            return 1
-        else:
-            return 0
-
-
+    # Buckets MUST match q_learning_env_advanced.py (discretize_*):
+    #   queue 0-2 -> 0, 3-5 -> 1, 6+ -> 2
+    #   green seconds (training used steps, same thresholds) <=3 -> 0, <=8 -> 1, else 2
+    #   diff = EW_total - NS_total: <=-3 -> -1, >=3 -> 1, else 0
+    # Each bucket is added already multiplied by its digit's place value
+    # (486, 162, 54, 18, 9, 3, 1); conditionals beat min() / int() calls here.
     def act(self, qN: int, qS: int, qE: int, qW: int, phase_val: int, green_elapsed_s: float) -> int:
-        ns = qN + qS
-        ew = qE + qW
-        diff_bucket = self._discretize_diff(ew - ns)
-
-        green_steps_like_training = int(green_elapsed_s)
-
-        state = (
-            self._discretize_queue(qN),
-            self._discretize_queue(qS),
-            self._discretize_queue(qE),
-            self._discretize_queue(qW),
-            int(phase_val),
-            self._discretize_green_steps(green_steps_like_training),
-            diff_bucket,
-        )
-
-        q_values = self.Q.get(state, [0.0, 0.0])
-        return 0 if q_values[0] >= q_values[1] else 1
+        diff = (qE + qW) - (qN + qS)
+        index = ((0 if qN <= 2 else 486 if qN <= 5 else 972)
+                 + (0 if qS <= 2 else 162 if qS <= 5 else 324)
+                 + (0 if qE <= 2 else 54 if qE <= 5 else 108)
+                 + (0 if qW <= 2 else 18 if qW <= 5 else 36)
+                 + (9 if phase_val else 0)
+                 + (0 if green_elapsed_s < 4 else 3 if green_elapsed_s < 9 else 6)
+                 + (0 if diff <= -3 else 2 if diff >= 3 else 1))
+        return self._greedy[index]
+
+    def decide(self, qN: int, qS: int, qE: int, qW: int, phase_val: int, green_elapsed_s: float) -> Tuple[int, str]:
+        return self.act(qN, qS, qE, qW, phase_val, green_elapsed_s), "q_value"
+
+    def state_index_batch(self, qN, qS, qE, qW, phase_val, green_elapsed_s) -> np.ndarray:
+        """Vectorized state index over arrays of replicas."""
+        def queue_bucket(q):
+            return np.minimum(np.asarray(q) // 3, 2)
+
+        diff = (qE + qW) - (qN + qS)
+        index = queue_bucket(qN)
+        index = index * 3 + queue_bucket(qS)
+        index = index * 3 + queue_bucket(qE)
+        index = index * 3 + queue_bucket(qW)
+        index = index * 2 + phase_val
+        index = index * 3 + np.digitize(np.trunc(green_elapsed_s), [4, 9])
+        return index * 3 + np.digitize(diff, [-2, 3])
+
+    def act_batch(self, qN, qS, qE, qW, phase_val, green_elapsed_s) -> np.ndarray:
+        """Vectorized act() over arrays of replicas."""
+        return self.actions[self.state_index_batch(qN, qS, qE, qW, phase_val, green_elapsed_s)].astype(int)
@@ -1,51 +1,84 @@
-import sys
+import argparse
 import os
 import time
-os.environ['SDL_VIDEODRIVER'] = 'dummy'
 
-import pygame
-from simulation import TrafficSimulation
+from simulation_core import SimulationCore
+from metrics_io import default_format, have_pyarrow
+from profiling import install_signal_dump
+
+parser = argparse.ArgumentParser(description="Generate metrics for all controllers.")
+parser.add_argument("--trace", help="replay a detector trace (CSV or .npy, see trace_arrivals.py) "
+                                    "instead of synthetic arrivals")
+parser.add_argument("--duration", type=float, default=120, help="simulated seconds per run")
+parser.add_argument("--sample-interval", type=float, default=None, metavar="MS",
+                    help="one aggregated metrics row per window of MS milliseconds (default: every tick)")
+parser.add_argument("--format", choices=["csv", "parquet", "npz", "auto"], default="csv",
+                    help="metrics file format; auto = parquet if pyarrow is installed, else npz")
+parser.add_argument("--trajectories", type=int, default=None, metavar="N",
+                    help="also record per-car trajectories every N ticks to metrics/trajectory_<controller>.traj "
+                         "(see trajectory.py)")
+parser.add_argument("--profile", action="store_true",
+                    help="time each tick stage and save metrics/profile_<controller>.json (see profiling.py)")
+parser.add_argument("--arrivals", choices=["legacy", "uniform_jitter", "poisson"], default="legacy",
+                    help="arrival model; uniform_jitter / poisson pre-draw the arrivals from seed 0 so every "
+                         "controller sees the same ones, but give a different load than legacy (see arrivals.py)")
+args = parser.parse_args()
+if args.format == "parquet" and not have_pyarrow():
+    parser.error("--format parquet needs pyarrow (pip install pyarrow); use --format npz or csv")
+
+file_format = default_format() if args.format == "auto" else args.format
 
 os.makedirs("metrics", exist_ok=True)
 
 controllers = ["actuated", "max_pressure", "q_learning"]
+# None keeps the legacy per-tick spawn check
+arrival_model = None if args.arrivals == "legacy" else args.arrivals
+seed = 0
 spawn_rate = 2.0
-duration_s = 120
+duration_s = args.duration
 
 print("="*60)
 print("GENERATING METRICS FOR ALL CONTROLLERS")
 print("="*60)
-print(f"Configuration: spawn_rate={spawn_rate}s, duration={duration_s}s\n")
+if args.trace:
+    print(f"Configuration: trace={args.trace}, duration={duration_s}s\n")
+else:
+    arrival_note = args.arrivals if arrival_model is None else f"{arrival_model} (seed {seed})"
+    print(f"Configuration: spawn_rate={spawn_rate}s, duration={duration_s}s, arrivals={arrival_note}\n")
 
 for ctrl in controllers:
     print(f"Running {ctrl}...", end=" ", flush=True)
 
-    pygame.init()
-    sim = TrafficSimulation()
-    sim.controller_name = ctrl
-    sim._apply_controller(ctrl)
-    sim.spawn_rate = spawn_rate
+    sim = SimulationCore(controller_name=ctrl, spawn_rate=spawn_rate, arrivals=arrival_model, seed=seed,
+                         trace=args.trace, sample_interval_ms=args.sample_interval,
+                         trajectory=f"metrics/trajectory_{ctrl}.traj" if args.trajectories else None,
+                         trajectory_decimation=args.trajectories or 1, profile=args.profile)
+
+    if args.profile:
+        install_signal_dump(sim.profiler)   # kill -USR1 <pid> prints the table mid-run
 
     start_time = time.time()
-    while sim.current_time < duration_s * 1000 and sim.running:
-        delta_time = 16.67
-        sim.update(delta_time)
+    sim.run(duration_s, delta_time=16.67, fast_forward=True)
 
     elapsed = time.time() - start_time
 
-    filename = f"metrics/metrics_{ctrl}.csv"
+    filename = f"metrics/metrics_{ctrl}.{file_format}"
     sim.export_metrics(filename)
+    sim.close()
 
     print(f"done ({elapsed:.1f}s)")
-
-    pygame.quit()
+    if args.profile:
+        sim.profiler.dump()
+        sim.profiler.dump(f"metrics/profile_{ctrl}.json")
+        stats = sim.traffic_controller.decision_stats()
+        print(f"  decisions: {stats['calls']} controller calls, {stats['hits']} cached ({stats['hit_rate']:.1%})")
 
 print("\n" + "="*60)
 print("COMPLETE")
 print("="*60)
 print("\nGenerated files in metrics/ folder:")
 for ctrl in controllers:
-    print(f"  - metrics_{ctrl}.csv")
+    print(f"  - metrics_{ctrl}.{file_format}")
 
 print("\nNext step:")
 print("  Run: python compare_results.py")
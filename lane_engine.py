@@ -0,0 +1,397 @@
+# lane_engine.py
+#
+# Struct-of-arrays alternative to CarManager.
+# Each lane keeps its cars as NumPy arrays ordered front (index 0) to back.
+# On a busy road all lanes advance together in a few whole-array passes
+# (headway, target speed, stop-line clamping); a road with few cars loops
+# over plain floats, which is cheaper than the arrays' fixed cost.
+
+import random
+from typing import Iterator, List, Dict, Optional, Tuple
+
+import numpy as np
+
+from models import Car, Direction, LightState, DIRECTION_INDEX
+from car_manager import CarManager
+
+
+# How far ahead a car looks for a leader (same constant as CarManager.update_cars)
+LOOKAHEAD = 100
+
+# Up to this many cars on the road, a loop over plain floats is cheaper than
+# the fixed cost of the array passes (about 150 us per tick)
+SCALAR_CARS = 200
+
+# Array passes per tick before unsettled lanes finish in that loop (at least 2)
+ARRAY_PASSES = 3
+
+
+def step_cars(cm: CarManager, position, speed, committed, leader_position, has_leader, green, delta_time: float,
+              leader_speed=None, relaxation=None, prev=None):
+    """One car-following step on arrays of any (broadcastable) shape.
+
+    Mirrors the per-car body of CarManager.update_cars. relaxation is
+    CarManager._relaxation(delta_time) for the continuous integrator (which
+    also needs leader_speed), None for the tick integrator.
+    The leader is the car followed; the continuous integrator's no-collision
+    clamp uses the car directly ahead in the lane, passed as
+    prev = (position, speed, exists) when it is not always the leader.
+    Inputs are not modified; returns (position, speed, committed).
+    """
+    start_position = position
+    committed = committed | (position >= cm.intersection_end) | ((position >= cm.stop_line_position) & green)
+
+    # Headway to the car ahead
+    gap = leader_position - position
+    near = has_leader & (gap > 0) & (gap < LOOKAHEAD)
+
+    target = np.full(position.shape, cm.max_speed)
+    target = np.where(near & (gap < cm.min_distance * 2), cm.max_speed * 0.5, target)
+    target = np.where(near & (gap < cm.min_distance), 0.0, target)
+
+    # Stopping logic at red/yellow lights
+    must_stop = ~committed & ~green
+    stop_pos = np.where(near, np.minimum(cm.stop_line_position, leader_position - cm.min_distance), cm.stop_line_position)
+    at_stop = must_stop & (position >= stop_pos)
+    position = np.where(at_stop, stop_pos, position)
+
+    distance_to_stop = stop_pos - position
+    approach = must_stop & ~at_stop & (distance_to_stop < 80)
+    target = np.where(approach, np.minimum(target, distance_to_stop / 10.0), target)
+    target = np.where(at_stop, 0.0, target)
+
+    if relaxation is None:
+        speed = speed + (target - speed) * 0.1
+        position = position + speed * delta_time
+        return position, speed, committed
+
+    decay, factor = relaxation
+    offset = speed - target
+    position = position + (target * delta_time + offset * factor)
+    speed = target + offset * decay
+
+    # Large steps: never through a red stop line, never into the car ahead
+    overshoot = must_stop & (position > stop_pos)
+    position = np.where(overshoot, stop_pos, position)
+    speed = np.where(overshoot, 0.0, speed)
+
+    prev_position, prev_speed, has_prev = prev if prev is not None else (leader_position, leader_speed, has_leader)
+    limit = prev_position - cm.min_distance
+    too_close = has_prev & (position > limit)
+    position = np.where(too_close, np.maximum(limit, start_position), position)
+    speed = np.where(too_close, np.minimum(speed, prev_speed), speed)
+    return position, speed, committed
+
+
+class _Lane:
+    """Growable arrays for one lane, ordered front (0) to back (n - 1)."""
+
+    def __init__(self, capacity: int = 16):
+        self.n = 0
+        self.position = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.committed = np.zeros(capacity, dtype=bool)
+        self.is_vip = np.zeros(capacity, dtype=bool)
+        self.spawn_time = np.zeros(capacity)
+        self.car_id = np.zeros(capacity, dtype=np.int64)
+        self.color_idx = np.zeros(capacity, dtype=np.int8)
+
+    _FIELDS = ("position", "speed", "committed", "is_vip", "spawn_time", "car_id", "color_idx")
+
+    def append(self, **values) -> None:
+        if self.n == len(self.position):
+            for name in self._FIELDS:
+                old = getattr(self, name)
+                new = np.zeros(2 * len(old), dtype=old.dtype)
+                new[:self.n] = old[:self.n]
+                setattr(self, name, new)
+        for name, value in values.items():
+            getattr(self, name)[self.n] = value
+        self.n += 1
+
+    def clear(self) -> None:
+        self.n = 0
+
+    def keep(self, mask) -> None:
+        """Drops every car whose mask entry is False, preserving order."""
+        kept = int(np.count_nonzero(mask))
+        for name in self._FIELDS:
+            arr = getattr(self, name)
+            arr[:kept] = arr[:self.n][mask]
+        self.n = kept
+
+
+class VectorizedCarManager(CarManager):
+    """Drop-in CarManager that advances each lane as NumPy arrays.
+
+    Same spawn rules, car-following model and public API as CarManager.
+    get_cars() / iter_cars() build Car snapshots, so mutating them does not affect the lanes.
+    """
+
+    def __init__(self, debug: bool = False, integrator: str = "tick", recorder=None,
+                 lane_length: float = CarManager.DEFAULT_LANE_LENGTH):
+        super().__init__(debug=debug, integrator=integrator, recorder=recorder, lane_length=lane_length)
+        self.lanes: Dict[Direction, _Lane] = {d: _Lane() for d in Direction}
+
+    def spawn_car(self, direction: Direction, force_vip: bool = False, current_time: float = 0.0,
+                  color_idx: Optional[int] = None) -> None:
+        # Same random draws as CarManager.spawn_car so both engines stay in sync
+        if color_idx is not None:
+            is_vip = force_vip
+        else:
+            is_vip = force_vip or (random.random() < self.VIP_SPAWN_PROB)
+            color_idx = random.choice(self.VIP_COLOR_IDX if is_vip else self.CAR_COLOR_IDX)
+
+        self.lanes[direction].append(
+            position=0.0,
+            speed=self.max_speed,
+            committed=False,
+            is_vip=is_vip,
+            spawn_time=current_time,
+            car_id=self.next_id,
+            color_idx=color_idx,
+        )
+        self.next_id += 1
+
+        self.queue_counts[direction] += 1
+        if is_vip:
+            self.vip_queue_counts[direction] += 1
+            self.vip_count += 1
+
+    def update_cars(self, get_light_state, delta_time: float, current_time: float = 0.0) -> None:
+        relaxation = self._relaxation(delta_time) if self.integrator == "continuous" else None
+
+        active = []
+        cars = 0
+        for direction, lane in self.lanes.items():
+            if lane.n:
+                active.append((direction, lane, get_light_state(direction) == LightState.GREEN))
+                cars += lane.n
+
+        if cars <= SCALAR_CARS:
+            for direction, lane, green in active:
+                n = lane.n
+                new = ([0.0] * n, [0.0] * n, [False] * n)
+                waiting = self._step_lane(lane.position[:n].tolist(), lane.speed[:n].tolist(),
+                                          lane.committed[:n].tolist(), new, green, delta_time, relaxation)
+                lane.position[:n], lane.speed[:n], lane.committed[:n] = new
+                self.queue_counts[direction] = len(waiting)
+                # Without VIPs on the road there is nothing to look up
+                self.vip_queue_counts[direction] = (sum(lane.is_vip[waiting].tolist())
+                                                    if self.vip_count and waiting else 0)
+        elif active:
+            self._advance_road(active, delta_time, relaxation)
+            for direction, _, _ in active:
+                # Recounting is one array pass, as cheap as tracking transitions here
+                self.queue_counts[direction], self.vip_queue_counts[direction] = self._scan_queue_counts(direction)
+
+        # Like CarManager, only the finished cars at the front of a lane leave
+        # (they are past the stop line, so the counts above stay valid)
+        for _, lane, _ in active:
+            if lane.position[0] >= self.lane_length:
+                done = np.logical_and.accumulate(lane.position[:lane.n] >= self.lane_length)
+                waits = current_time - lane.spawn_time[:lane.n][done]
+                vips = lane.is_vip[:lane.n][done]
+                for wait_time, is_vip in zip(waits.tolist(), vips.tolist()):
+                    self.wait_stats.add(wait_time, is_vip)
+                self.vip_count -= int(np.count_nonzero(vips))
+                lane.keep(~done)
+
+        if self.recorder is not None and self.recorder.sample():
+            self._record_trajectories(current_time)
+
+    def _record_trajectories(self, current_time: float) -> None:
+        for direction, lane in self.lanes.items():
+            n = lane.n
+            if n:
+                self.recorder.write(current_time, lane.car_id[:n], DIRECTION_INDEX[direction],
+                                    lane.position[:n], lane.speed[:n], lane.committed[:n])
+
+    def _advance_road(self, active, delta_time: float, relaxation=None) -> None:
+        """Advances every lane with cars, given as (direction, lane, green), in place.
+
+        CarManager updates a lane front to back, so each car sees its
+        leader's *new* position. All lanes go through the same array passes:
+        the first uses the old positions, each further one the previous
+        pass's results. A car depends only on the cars ahead of it, so once
+        two passes agree on a lane's first k cars those k are exact. After
+        at most ARRAY_PASSES passes, a lane still changing is finished front
+        to back by _step_lane from its first changed car.
+        """
+        sizes = [lane.n for _, lane, _ in active]
+        offsets = np.cumsum([0] + sizes).tolist()
+        position = np.concatenate([lane.position[:lane.n] for _, lane, _ in active])
+        speed = np.concatenate([lane.speed[:lane.n] for _, lane, _ in active])
+        committed = np.concatenate([lane.committed[:lane.n] for _, lane, _ in active])
+        green = np.repeat([is_green for _, _, is_green in active], sizes)
+
+        # The front car of each lane has nothing ahead of it
+        first = np.zeros(len(position), dtype=bool)
+        first[offsets[:-1]] = True
+        has_prev = ~first
+        prev_position = np.empty_like(position)
+        prev_speed = np.empty_like(speed)
+
+        result = None
+        changed = None
+        for _ in range(ARRAY_PASSES):
+            source = (position, speed) if result is None else result
+            prev_position[1:] = source[0][:-1]
+            prev_speed[1:] = source[1][:-1]
+            prev_position[first] = 0.0
+            prev_speed[first] = 0.0
+
+            leader = self._leaders(position, prev_position, first)
+            if leader is None:
+                new = step_cars(self, position, speed, committed, prev_position, has_prev, green, delta_time,
+                                prev_speed, relaxation)
+            else:
+                new = step_cars(self, position, speed, committed, prev_position[leader + 1], leader >= 0, green,
+                                delta_time, prev_speed[leader + 1], relaxation,
+                                prev=(prev_position, prev_speed, has_prev))
+            if result is not None:
+                changed = (new[0] != result[0]) | (new[1] != result[1])
+            result = new
+            if changed is not None and not changed.any():
+                changed = None
+                break
+
+        for k, (_, lane, is_green) in enumerate(active):
+            lo, hi = offsets[k], offsets[k + 1]
+            n = lane.n
+            unsettled = np.flatnonzero(changed[lo:hi]) if changed is not None else ()
+            if len(unsettled):
+                old = (position[lo:hi].tolist(), speed[lo:hi].tolist(), committed[lo:hi].tolist())
+                new = tuple(a[lo:hi].tolist() for a in result)
+                self._step_lane(*old, new, is_green, delta_time, relaxation, start=int(unsettled[0]))
+            else:
+                new = tuple(a[lo:hi] for a in result)
+            lane.position[:n], lane.speed[:n], lane.committed[:n] = new
+
+    def _step_lane(self, position: List[float], speed: List[float], committed: List[bool], new: Tuple[list, ...],
+                   green: bool, delta_time: float, relaxation=None, start: int = 0) -> List[int]:
+        """CarManager._update_lane on plain floats, for small roads and for
+        lanes the array passes left unsettled.
+
+        position / speed / committed are the lane's cars before the tick,
+        front first. new holds the same three lists after the tick: entries
+        before start are already final, the rest are filled in here.
+        Returns the indices of the cars from start on left waiting.
+        """
+        stop_line = self.stop_line_position
+        new_position, new_speed, new_committed = new
+        waiting = []
+        lead = None     # new position of the car followed
+        for i, p in enumerate(position):
+            # The car ahead is the previous one, unless both share a position
+            if i and new_position[i - 1] > p:
+                lead = new_position[i - 1]
+            elif lead is not None and lead <= p:
+                lead = None
+            if i < start:
+                continue
+
+            start_position = p
+            s = speed[i]
+            c = committed[i] or p >= self.intersection_end or (green and p >= stop_line)
+
+            target = self.max_speed
+            near = lead is not None and lead - p < LOOKAHEAD
+            if near:
+                gap = lead - p
+                if gap < self.min_distance:
+                    target = 0.0
+                elif gap < self.min_distance * 2:
+                    target = self.max_speed * 0.5
+
+            stop_pos = None
+            if not c and not green:
+                stop_pos = min(stop_line, lead - self.min_distance) if near else stop_line
+                if p >= stop_pos:
+                    p = stop_pos
+                    target = 0.0
+                elif stop_pos - p < 80:
+                    target = min(target, (stop_pos - p) / 10.0)
+
+            if relaxation is None:
+                s = s + (target - s) * 0.1
+                p = p + s * delta_time
+            else:
+                decay, factor = relaxation
+                offset = s - target
+                p = p + (target * delta_time + offset * factor)
+                s = target + offset * decay
+                if stop_pos is not None and p > stop_pos:
+                    p = stop_pos
+                    s = 0.0
+                if i and p > new_position[i - 1] - self.min_distance:
+                    p = max(new_position[i - 1] - self.min_distance, start_position)
+                    s = min(s, new_speed[i - 1])
+
+            new_position[i] = p
+            new_speed[i] = s
+            new_committed[i] = c
+            if p <= stop_line and not c:
+                waiting.append(i)
+        return waiting
+
+    @staticmethod
+    def _leaders(position: np.ndarray, prev_position: np.ndarray, first: np.ndarray) -> Optional[np.ndarray]:
+        """Index of the car each car follows, -1 for none, or None when every
+        car follows the one directly ahead.
+
+        CarManager._update_lane follows the previous car if its new position
+        is ahead; otherwise it keeps following that car's own leader while that
+        one is still ahead, and else nothing. A follower that closed in on a
+        slow leader can pass it within a tick, so such cars do occur.
+        prev_position[i] is the new position of car i - 1; first marks the
+        front car of each lane.
+        """
+        behind = np.flatnonzero((prev_position <= position) & ~first)
+        if len(behind) == 0:
+            return None
+        leader = np.arange(-1, len(position) - 1)
+        leader[first] = -1
+        # Only the rare cars not behind their predecessor need the sequential rule
+        for i in behind.tolist():
+            j = leader[i - 1]
+            leader[i] = j if j >= 0 and prev_position[j + 1] > position[i] else -1
+        return leader
+
+    def _lane_arrays(self, direction: Direction) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        lane = self.lanes[direction]
+        return lane.position[:lane.n], lane.speed[:lane.n], lane.committed[:lane.n]
+
+    def _set_lane_arrays(self, direction: Direction, position: np.ndarray, speed: np.ndarray,
+                         committed: np.ndarray) -> None:
+        lane = self.lanes[direction]
+        lane.position[:lane.n] = position
+        lane.speed[:lane.n] = speed
+        lane.committed[:lane.n] = committed
+
+    def _scan_queue_counts(self, direction: Direction) -> Tuple[int, int]:
+        lane = self.lanes[direction]
+        waiting = (lane.position[:lane.n] <= self.stop_line_position) & ~lane.committed[:lane.n]
+        return int(np.count_nonzero(waiting)), int(np.count_nonzero(waiting & lane.is_vip[:lane.n]))
+
+    def get_car_count(self) -> int:
+        return sum(lane.n for lane in self.lanes.values())
+
+    def iter_cars(self) -> Iterator[Car]:
+        for direction, lane in self.lanes.items():
+            lane_idx = DIRECTION_INDEX[direction]
+            n = lane.n
+            for car in zip(
+                lane.car_id[:n].tolist(), lane.position[:n].tolist(), lane.speed[:n].tolist(),
+                lane.committed[:n].tolist(), lane.color_idx[:n].tolist(), lane.is_vip[:n].tolist(),
+                lane.spawn_time[:n].tolist(),
+            ):
+                car_id, position, speed, committed, color_idx, is_vip, spawn_time = car
+                yield Car(car_id, lane_idx, position, speed, committed, color_idx, is_vip, spawn_time)
+
+
+# Car engines selectable by name
+ENGINES = {
+    "python": CarManager,
+    "vectorized": VectorizedCarManager,
+}
@@ -0,0 +1,131 @@
+# metrics_io.py
+#
+# Saving and loading metric files in one bulk call per file.
+#   .parquet  compressed columnar (needs pyarrow)
+#   .npz      compressed NumPy arrays (always available)
+#   .csv      plain text, as before
+# Binary formats keep the recorder's typed columns, with phase as its int8
+# code (see metrics.PHASES); load_metrics turns it back into "NS" / "EW" so
+# the analysis scripts see the same DataFrame whatever the format.
+
+import glob
+import os
+from typing import Dict, List
+
+import numpy as np
+
+from metrics import PHASES
+
+
+FORMATS = ("parquet", "npz", "csv")
+
+
+def have_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def require_pyarrow() -> None:
+    """Raises ImportError with install instructions when pyarrow is missing."""
+    if not have_pyarrow():
+        raise ImportError("Parquet metric files need pyarrow: pip install pyarrow "
+                          "(commented out in requirements.txt), or use the npz / csv format")
+
+
+def default_format() -> str:
+    """Parquet when pyarrow is installed, otherwise npz."""
+    return "parquet" if have_pyarrow() else "npz"
+
+
+def _file_columns(recorder) -> Dict[str, np.ndarray]:
+    """Recorder columns as stored in files ("time" is written as "time_s")."""
+    if hasattr(recorder, "flush"):
+        recorder.flush()    # WindowedMetrics: close the open window first
+    return {("time_s" if name == "time" else name): values for name, values in recorder.columns().items()}
+
+
+def save_metrics(recorder, filename: str) -> str:
+    """Writes a MetricsRecorder / WindowedMetrics; the format follows the
+    extension (a name without one gets default_format()). Returns the path."""
+    _, ext = os.path.splitext(filename)
+    fmt = ext[1:].lower()
+    if fmt not in FORMATS:
+        fmt = default_format()
+        filename = f"{filename}.{fmt}"
+
+    if fmt == "csv":
+        recorder.write_csv(filename)
+    elif fmt == "npz":
+        np.savez_compressed(filename, **_file_columns(recorder))
+    else:
+        require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table(_file_columns(recorder))
+        pq.write_table(table, filename, compression="zstd")
+    return filename
+
+
+def _detect_format(path: str) -> str:
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic == b"PAR1":
+        return "parquet"
+    if magic[:2] == b"PK":      # zip archive written by np.savez_compressed
+        return "npz"
+    return "csv"
+
+
+def load_metrics(path: str):
+    """pandas DataFrame of a metrics file in any of FORMATS (detected from
+    the file contents, not the extension)."""
+    try:
+        import pandas as pd
+    except ImportError as e:
+        raise ImportError("loading metric files needs pandas: pip install -r requirements.txt") from e
+
+    fmt = _detect_format(path)
+    if fmt == "csv":
+        return pd.read_csv(path)
+    if fmt == "npz":
+        with np.load(path) as data:
+            df = pd.DataFrame({name: data[name] for name in data.files})
+    else:
+        require_pyarrow()
+        df = pd.read_parquet(path)
+
+    if "phase" in df.columns and df["phase"].dtype.kind in "iu":
+        df["phase"] = np.asarray(PHASES)[df["phase"].to_numpy()]
+    return df
+
+
+def find_metric_files(pattern: str) -> List[str]:
+    """Metric files matching `pattern` (without extension) in any format.
+
+    When one run was saved in several formats, only one file is returned,
+    preferring Parquet, then npz, then CSV.
+    """
+    found = {}
+    for fmt in reversed(FORMATS):
+        for path in glob.glob(f"{pattern}.{fmt}"):
+            stem = os.path.splitext(path)[0]
+            if not stem.endswith("_events"):    # event logs saved next to metrics
+                found[stem] = path
+    return sorted(found.values())
+
+
+def load_run_events(path: str):
+    """The phase event log saved next to a metrics file, or None."""
+    from phase_log import events_path, load_events
+
+    events = events_path(path)
+    return load_events(events) if os.path.exists(events) else None
+
+
+def metric_name(path: str) -> str:
+    """File name without directory and extension."""
+    return os.path.splitext(os.path.basename(path))[0]
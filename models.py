@@ -19,14 +19,49 @@ class LightState(Enum):
     RED = "red"
 
 
-# Represents a single car in the simulation
-@dataclass
+# Lookup tables for the small ints stored on each car
+DIRECTIONS: Tuple[Direction, ...] = tuple(Direction)
+DIRECTION_INDEX = {d: i for i, d in enumerate(DIRECTIONS)}
+
+# Regular car colors
+CAR_COLORS = (
+    (59, 130, 246),
+    (239, 68, 68),
+    (16, 185, 129),
+    (245, 158, 11),
+    (139, 92, 246),
+    (236, 72, 153),
+)
+
+# Special colors for VIP/emergency cars
+VIP_COLORS = (
+    (255, 255, 255),    # white
+    (0, 200, 255),      # bright blue
+    (255, 0, 0),        # red
+)
+
+# Regular colors first, then VIP colors; Car.color_idx indexes this
+COLOR_PALETTE = CAR_COLORS + VIP_COLORS
+
+
+# Represents a single car in the simulation.
+# Slotted, with an integer id and direction/color stored as table indices,
+# to keep the per-car footprint and attribute access in update_cars cheap.
+@dataclass(slots=True)
 class Car:
-    id: str
-    direction: Direction
+    id: int
+    lane: int           # index into DIRECTIONS
     position: float
     speed: float
     committed: bool
-    color: Tuple[int, int, int]
+    color_idx: int      # index into COLOR_PALETTE
     is_vip: bool = False
     spawn_time: float = 0.0
+
+    @property
+    def direction(self) -> Direction:
+        return DIRECTIONS[self.lane]
+
+    @property
+    def color(self) -> Tuple[int, int, int]:
+        return COLOR_PALETTE[self.color_idx]
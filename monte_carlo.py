@@ -0,0 +1,358 @@
+# monte_carlo.py
+#
+# Batched Monte Carlo engine: advances N independent replicas of the
+# intersection as one set of NumPy arrays. With a thousand or more replicas
+# each costs about a tenth of a serial SimulationCore run.
+#
+# Same model as SimulationCore: per-tick random spawn check, CarManager
+# car-following (lane_engine.step_cars), TrafficController phase timing with
+# VIP preemption, and the decision controllers vectorized over replicas.
+#
+# Usage:
+#   python3 monte_carlo.py --replicas 1000 --spawn-rate 2.0
+
+import argparse
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from car_manager import CarManager
+from controller_registry import DEFAULT_CONTROLLER, get_policy
+from lane_engine import step_cars
+from traffic_controller import TrafficController
+
+
+# Light state of the active axis (the other axis is always red)
+GREEN = 0
+YELLOW = 1
+
+# Queue histogram size per replica; longer queues fall in the last bucket
+MAX_TRACKED_QUEUE = 256
+
+
+def make_batch_policy(controller_name: str):
+    """Vectorized decision policy for a SimulationCore controller name
+    (the registry's shared policy; unknown names fall back to actuated)."""
+    try:
+        return get_policy(controller_name)
+    except ValueError:
+        return get_policy(DEFAULT_CONTROLLER)
+
+
+class BatchSimulation:
+    """N independent intersections stepped together.
+
+    Cars live in arrays of shape (N, 4, capacity), ordered front (slot 0) to
+    back like lane_engine._Lane, and move front to back like CarManager.
+    Arrivals append at count[replica, lane]; finished cars shift the lane.
+    Lanes are ordered NORTH, SOUTH, EAST, WEST like models.DIRECTIONS.
+    """
+
+    def __init__(self, replicas: int, controller_name: str = "actuated", spawn_rate: float = 2.0,
+                 seed: Optional[int] = None, integrator: str = "tick", capacity: int = 16,
+                 lane_length: float = CarManager.DEFAULT_LANE_LENGTH):
+        self.n = replicas
+        self.controller_name = controller_name
+        self.spawn_rate = spawn_rate
+        self.rng = np.random.default_rng(seed)
+
+        # Geometry, speeds and integrator come from CarManager itself
+        self.cm = CarManager(integrator=integrator, lane_length=lane_length)
+        self.policy = make_batch_policy(controller_name)
+
+        timing = TrafficController()
+        self.green_duration = timing.green_duration
+        self.yellow_duration = timing.yellow_duration
+        self.min_green_duration = timing.min_green_duration
+
+        shape = (replicas, 4, capacity)
+        self.position = np.zeros(shape)
+        self.speed = np.zeros(shape)
+        self.committed = np.zeros(shape, dtype=bool)
+        self.is_vip = np.zeros(shape, dtype=bool)
+        self.spawn_time = np.zeros(shape)
+        self.count = np.zeros((replicas, 4), dtype=np.int64)
+
+        # Per-replica light state
+        self.phase = np.zeros(replicas, dtype=np.int64)         # 0 = NS, 1 = EW
+        self.light = np.full(replicas, GREEN, dtype=np.int64)   # state of the active axis
+        self.phase_start = np.zeros(replicas)
+        self.current_time = 0.0
+        self.last_spawn_time = np.zeros(replicas)
+
+        # Running metrics per replica
+        self.ticks = 0
+        self.queue_sum = np.zeros((replicas, 4))
+        self.vip_queue_sum = np.zeros(replicas)
+        self.cumulative_queue = np.zeros(replicas)
+        self.queue_hist = np.zeros((replicas, MAX_TRACKED_QUEUE + 1), dtype=np.int64)
+        self.switches = np.zeros(replicas, dtype=np.int64)
+        self.wait_sum = np.zeros(replicas)
+        self.completed = np.zeros(replicas, dtype=np.int64)
+        self.vip_wait_sum = np.zeros(replicas)
+        self.vip_completed = np.zeros(replicas, dtype=np.int64)
+        self._prev_total = None
+        self._prev_time = 0.0
+        self._prev_phase = None
+
+    # --- Cars ---------------------------------------------------------------
+    _FIELDS = ("position", "speed", "committed", "is_vip", "spawn_time")
+
+    @property
+    def capacity(self) -> int:
+        return self.position.shape[2]
+
+    def _grow(self) -> None:
+        old = self.capacity
+        for name in self._FIELDS:
+            arr = getattr(self, name)
+            grown = np.zeros(arr.shape[:2] + (2 * old,), dtype=arr.dtype)
+            grown[..., :old] = arr
+            setattr(self, name, grown)
+
+    def _spawn(self) -> None:
+        threshold = self.spawn_rate * 1000 + self.rng.random(self.n) * 1000
+        spawning = np.flatnonzero(self.current_time - self.last_spawn_time > threshold)
+        if len(spawning) == 0:
+            return
+
+        lanes = self.rng.integers(0, 4, len(spawning))
+        vips = self.rng.random(len(spawning)) < CarManager.VIP_SPAWN_PROB
+        if (self.count[spawning, lanes] >= self.capacity).any():
+            self._grow()
+
+        slot = self.count[spawning, lanes]
+        self.position[spawning, lanes, slot] = 0.0
+        self.speed[spawning, lanes, slot] = self.cm.max_speed
+        self.committed[spawning, lanes, slot] = False
+        self.is_vip[spawning, lanes, slot] = vips
+        self.spawn_time[spawning, lanes, slot] = self.current_time
+        self.count[spawning, lanes] += 1
+        self.last_spawn_time[spawning] = self.current_time
+
+    def _window(self) -> int:
+        """Slots in use by the longest lane; everything beyond is empty."""
+        return int(self.count.max())
+
+    def _queues(self):
+        """Waiting and waiting-VIP cars per (replica, lane)."""
+        w = self._window()
+        active = np.arange(w) < self.count[..., None]
+        waiting = active & (self.position[..., :w] <= self.cm.stop_line_position) & ~self.committed[..., :w]
+        return waiting.sum(axis=2), (waiting & self.is_vip[..., :w]).sum(axis=2)
+
+    def _move_cars(self, delta_time: float) -> None:
+        """CarManager._update_lane for every lane of every replica.
+
+        One pass over the slots, front to back, each vectorized over the
+        (replica, lane) rows that have a car in that slot, so every car sees
+        its leader's new position like in CarManager.
+        """
+        w = self._window()
+        if w == 0:
+            return
+
+        # N/S lanes are green when phase NS is active and green, same for E/W
+        green_ns = (self.phase == 0) & (self.light == GREEN)
+        green_ew = (self.phase == 1) & (self.light == GREEN)
+        green = np.stack([green_ns, green_ns, green_ew, green_ew], axis=1).reshape(-1)
+
+        relaxation = self.cm._relaxation(delta_time) if self.cm.integrator == "continuous" else None
+
+        # One row per (replica, lane); views, so the slots are updated in place
+        count = self.count.reshape(-1)
+        position = self.position.reshape(count.size, -1)
+        speed = self.speed.reshape(count.size, -1)
+        committed = self.committed.reshape(count.size, -1)
+
+        rows = np.flatnonzero(count > 0)
+        prev_position = np.zeros(len(rows))     # new position of the car in the slot before
+        prev_speed = np.zeros(len(rows))
+        lead = np.zeros(len(rows))              # new position of the car followed
+        has_lead = np.zeros(len(rows), dtype=bool)
+        for k in range(w):
+            if k:
+                still = count[rows] > k
+                rows = rows[still]
+                prev_position, prev_speed = prev_position[still], prev_speed[still]
+                lead, has_lead = lead[still], has_lead[still]
+            old_position = position[rows, k]
+
+            # CarManager's leader rule: the previous car if its new position is
+            # ahead, else the current leader while it is still ahead
+            ahead = prev_position > old_position if k else has_lead
+            has_lead = ahead | (has_lead & (lead > old_position))
+            lead = np.where(ahead, prev_position, lead)
+
+            new_position, new_speed, new_committed = step_cars(
+                self.cm, old_position, speed[rows, k], committed[rows, k], lead, has_lead, green[rows],
+                delta_time, relaxation=relaxation, prev=(prev_position, prev_speed, k > 0),
+            )
+            position[rows, k] = new_position
+            speed[rows, k] = new_speed
+            committed[rows, k] = new_committed
+            prev_position, prev_speed = new_position, new_speed
+
+        # Like CarManager, only the finished cars at the front of a lane leave
+        rows = np.flatnonzero((count > 0) & (position[:, 0] >= self.cm.lane_length))
+        if len(rows) == 0:
+            return
+        slot = np.arange(w)
+        done = np.logical_and.accumulate((position[rows, :w] >= self.cm.lane_length) & (slot < count[rows, None]),
+                                         axis=1)
+        replica = rows // 4
+        waits = np.where(done, self.current_time - self.spawn_time.reshape(count.size, -1)[rows, :w], 0.0)
+        vip_done = done & self.is_vip.reshape(count.size, -1)[rows, :w]
+        np.add.at(self.wait_sum, replica, waits.sum(axis=1))
+        np.add.at(self.completed, replica, done.sum(axis=1))
+        np.add.at(self.vip_wait_sum, replica, np.where(vip_done, waits, 0.0).sum(axis=1))
+        np.add.at(self.vip_completed, replica, vip_done.sum(axis=1))
+
+        removed = done.sum(axis=1)
+        order = np.minimum(slot + removed[:, None], w - 1)
+        for name in self._FIELDS:
+            arr = getattr(self, name).reshape(count.size, -1)
+            arr[rows, :w] = np.take_along_axis(arr[rows, :w], order, axis=1)
+        count[rows] -= removed
+
+    # --- Lights -------------------------------------------------------------
+    def _update_lights(self, queues, vip_queues) -> None:
+        """Vectorized TrafficController.update for every replica."""
+        ns_vips = vip_queues[:, 0] + vip_queues[:, 1]
+        ew_vips = vip_queues[:, 2] + vip_queues[:, 3]
+        preempt = (ns_vips > 0) | (ew_vips > 0)
+
+        elapsed = self.current_time - self.phase_start
+        green = self.light == GREEN
+
+        # Early-switch decision, only asked once min green has passed
+        qN, qS, qE, qW = queues.T
+        asking = green & ~preempt & (elapsed >= self.min_green_duration) & ((qN + qS + qE + qW) > 0)
+        should_switch = np.zeros(self.n, dtype=bool)
+        if asking.any():
+            green_s = (elapsed / 1000.0).astype(np.int64)
+            actions = self.policy.act_batch(qN, qS, qE, qW, self.phase, green_s)
+            should_switch = asking & (actions == 1)
+
+        to_yellow = ~preempt & green & ((elapsed >= self.green_duration) | should_switch)
+        to_other = ~preempt & ~green & (elapsed >= self.yellow_duration)
+
+        self.light[to_yellow] = YELLOW
+        self.phase[to_other] = 1 - self.phase[to_other]
+        self.light[to_other] = GREEN
+        self.phase_start[to_yellow | to_other] = self.current_time
+
+        # VIP preemption: the axis with VIPs waiting (or the current one if both) gets green now
+        desired = np.where((ns_vips > 0) & (ew_vips == 0), 0, np.where((ew_vips > 0) & (ns_vips == 0), 1, self.phase))
+        self.phase[preempt] = desired[preempt]
+        self.light[preempt] = GREEN
+        self.phase_start[preempt] = self.current_time
+
+    # --- Main loop ----------------------------------------------------------
+    def update(self, delta_time: float) -> None:
+        self.current_time += delta_time
+        self._spawn()
+
+        queues, vip_queues = self._queues()
+        self._update_lights(queues, vip_queues)
+        self._move_cars(delta_time)
+        self._record(queues, vip_queues)
+
+    def _record(self, queues, vip_queues) -> None:
+        total = queues.sum(axis=1)
+        time_s = self.current_time / 1000.0
+
+        self.ticks += 1
+        self.queue_sum += queues
+        self.vip_queue_sum += vip_queues.sum(axis=1)
+        self.queue_hist[np.arange(self.n), np.minimum(total, MAX_TRACKED_QUEUE)] += 1
+        if self._prev_total is not None:
+            # Trapezoid rule over consecutive samples, as np.trapezoid in the analysis scripts
+            self.cumulative_queue += (total + self._prev_total) / 2.0 * (time_s - self._prev_time)
+            self.switches += self.phase != self._prev_phase
+        self._prev_total = total
+        self._prev_time = time_s
+        self._prev_phase = self.phase.copy()
+
+    def run(self, duration_s: float, delta_time: float = 16.67) -> Dict[str, np.ndarray]:
+        while self.current_time < duration_s * 1000:
+            self.update(delta_time)
+        return self.results()
+
+    def results(self) -> Dict[str, np.ndarray]:
+        """Per-replica metrics, matching the columns of comparison_summary.csv."""
+        ticks = max(self.ticks, 1)
+        avg_dir = self.queue_sum / ticks
+        completed = np.maximum(self.completed, 1)
+        return {
+            "avg_total_queue": avg_dir.sum(axis=1),
+            "p95_total_queue": _hist_quantile(self.queue_hist, 0.95),
+            "max_total_queue": _hist_max(self.queue_hist),
+            "avg_vip_queue": self.vip_queue_sum / ticks,
+            "avg_wait_time": np.where(self.completed > 0, self.wait_sum / completed, 0.0),
+            "total_switches": self.switches,
+            "cumulative_queue": self.cumulative_queue,
+            "completed": self.completed,
+            "avg_north": avg_dir[:, 0],
+            "avg_south": avg_dir[:, 1],
+            "avg_east": avg_dir[:, 2],
+            "avg_west": avg_dir[:, 3],
+        }
+
+
+def _hist_max(hist: np.ndarray) -> np.ndarray:
+    present = hist > 0
+    return hist.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1)
+
+
+def _hist_quantile(hist: np.ndarray, q: float) -> np.ndarray:
+    """Per-row quantile of integer samples given as counts, with linear
+    interpolation between order statistics (pandas/NumPy default)."""
+    total = hist.sum(axis=1)
+    cum = np.cumsum(hist, axis=1)
+    rank = q * (total - 1)
+    lo = np.floor(rank).astype(np.int64)
+    hi = np.ceil(rank).astype(np.int64)
+    # The value of order statistic k is the first bucket whose cumulative count exceeds k
+    lo_val = (cum <= lo[:, None]).sum(axis=1)
+    hi_val = (cum <= hi[:, None]).sum(axis=1)
+    return lo_val + (hi_val - lo_val) * (rank - lo)
+
+
+def summarize(results: Dict[str, np.ndarray]) -> Dict[str, tuple]:
+    """(mean, 95% confidence half-width) of every metric."""
+    out = {}
+    for name, values in results.items():
+        values = np.asarray(values, dtype=float)
+        half_width = 1.96 * values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else 0.0
+        out[name] = (float(values.mean()), float(half_width))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched Monte Carlo controller comparison.")
+    parser.add_argument("--replicas", type=int, default=1000)
+    parser.add_argument("--controllers", nargs="+", default=["actuated", "max_pressure", "q_learning"])
+    parser.add_argument("--spawn-rate", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--lane-length", type=float, default=CarManager.DEFAULT_LANE_LENGTH)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"MONTE CARLO: {args.replicas} replicas, spawn_rate={args.spawn_rate}s, duration={args.duration}s")
+    print("=" * 70)
+    for ctrl in args.controllers:
+        start = time.time()
+        sim = BatchSimulation(args.replicas, ctrl, args.spawn_rate, seed=args.seed, lane_length=args.lane_length)
+        stats = summarize(sim.run(args.duration))
+        print(f"\n{ctrl} ({time.time() - start:.1f}s)")
+        for name in ["avg_total_queue", "p95_total_queue", "avg_wait_time", "total_switches", "cumulative_queue"]:
+            mean, half_width = stats[name]
+            print(f"  {name:<18} {mean:>10.2f} ± {half_width:.2f}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# phase_log.py
+#
+# Event-sourced record of what the signal did: one small fixed-size entry per
+# light transition, VIP request / preemption or early-switch decision, instead
+# of a phase value repeated on every tick. Switch counts, green times and
+# preemption latency come from the events alone, O(events) for any run length.
+
+import os
+from array import array
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# Event kinds
+GREEN = 0           # axis turned green
+YELLOW = 1          # axis turned yellow (reason: "green_timeout" or the controller's)
+RED = 2             # axis turned red
+PREEMPT = 3         # VIP preemption forced the axis green
+VIP_REQUEST = 4     # VIPs started waiting on the axis
+KINDS = ("green", "yellow", "red", "preempt", "vip_request")
+
+AXES = ("NS", "EW")
+AXIS_CODE = {name: i for i, name in enumerate(AXES)}
+
+
+class PhaseEventLog:
+    """Append-only event columns: time (ms), kind, axis and reason.
+
+    Reasons are interned strings; the column stores their index.
+    """
+
+    def __init__(self):
+        self.time = array("d")
+        self.kind = array("b")
+        self.axis = array("b")
+        self.reason = array("h")
+        self.reasons: List[str] = [""]
+        self._reason_code: Dict[str, int] = {"": 0}
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def emit(self, time: float, kind: int, axis: str, reason: str = "") -> None:
+        code = self._reason_code.get(reason)
+        if code is None:
+            code = self._reason_code[reason] = len(self.reasons)
+            self.reasons.append(reason)
+        self.time.append(time)
+        self.kind.append(kind)
+        self.axis.append(AXIS_CODE[axis])
+        self.reason.append(code)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Zero-copy NumPy views of the event columns."""
+        return {
+            "time": np.frombuffer(self.time, dtype=np.float64),
+            "kind": np.frombuffer(self.kind, dtype=np.int8),
+            "axis": np.frombuffer(self.axis, dtype=np.int8),
+            "reason": np.frombuffer(self.reason, dtype=np.int16),
+        }
+
+    def records(self) -> List[tuple]:
+        """(time_ms, kind, axis, reason) tuples with names, for printing."""
+        return [
+            (t, KINDS[k], AXES[a], self.reasons[r])
+            for t, k, a, r in zip(self.time, self.kind, self.axis, self.reason)
+        ]
+
+
+# --- Persistence --------------------------------------------------------------
+def events_path(metrics_filename: str) -> str:
+    """Event file stored next to a metrics file: metrics_x.csv -> metrics_x_events.npz."""
+    return os.path.splitext(metrics_filename)[0] + "_events.npz"
+
+
+def save_events(log: PhaseEventLog, filename: str) -> None:
+    np.savez_compressed(filename, reasons=np.array(log.reasons), **log.columns())
+
+
+def load_events(filename: str) -> PhaseEventLog:
+    log = PhaseEventLog()
+    with np.load(filename) as data:
+        log.time.frombytes(data["time"].astype(np.float64).tobytes())
+        log.kind.frombytes(data["kind"].astype(np.int8).tobytes())
+        log.axis.frombytes(data["axis"].astype(np.int8).tobytes())
+        log.reason.frombytes(data["reason"].astype(np.int16).tobytes())
+        log.reasons = data["reasons"].tolist()
+    log._reason_code = {name: i for i, name in enumerate(log.reasons)}
+    return log
+
+
+# --- Analysis (all O(events)) ---------------------------------------------------
+def switch_count(log: PhaseEventLog) -> int:
+    """Changes of the active axis, the same count as diffing a per-tick phase column."""
+    cols = log.columns()
+    green_axes = cols["axis"][cols["kind"] == GREEN]
+    return int(np.count_nonzero(np.diff(green_axes)))
+
+
+def green_times(log: PhaseEventLog, axis: Optional[str] = None, end_time: Optional[float] = None) -> np.ndarray:
+    """Durations (ms) of every green interval, optionally for one axis.
+
+    An interval runs from a GREEN event to the axis' next YELLOW or RED.
+    A green still running at the end counts up to end_time if given.
+    """
+    durations = []
+    started = [None, None]
+    for t, kind, a in zip(log.time, log.kind, log.axis):
+        if kind == GREEN:
+            if started[a] is None:
+                started[a] = t
+        elif kind in (YELLOW, RED) and started[a] is not None:
+            durations.append((a, t - started[a]))
+            started[a] = None
+    if end_time is not None:
+        durations.extend((a, end_time - t) for a, t in enumerate(started) if t is not None)
+
+    wanted = None if axis is None else AXIS_CODE[axis]
+    return np.array([d for a, d in durations if wanted is None or a == wanted], dtype=float)
+
+
+def preemption_latencies(log: PhaseEventLog) -> np.ndarray:
+    """Time (ms) from VIPs starting to wait on an axis until that axis is green.
+
+    0 when the axis was already green at the request.
+    """
+    latencies = []
+    green_axis = None
+    pending = [None, None]
+    for t, kind, a in zip(log.time, log.kind, log.axis):
+        if kind == VIP_REQUEST:
+            if green_axis == a:
+                latencies.append(0.0)
+            else:
+                pending[a] = t
+        elif kind == GREEN:
+            green_axis = a
+            if pending[a] is not None:
+                latencies.append(t - pending[a])
+                pending[a] = None
+        elif kind in (YELLOW, RED) and green_axis == a:
+            green_axis = None
+    return np.array(latencies, dtype=float)
+
+
+def summarize_events(log: PhaseEventLog, end_time: Optional[float] = None) -> Dict[str, float]:
+    greens = green_times(log, end_time=end_time)
+    latencies = preemption_latencies(log)
+    kinds = log.columns()["kind"]
+    return {
+        "switches": switch_count(log),
+        "avg_green_s": float(greens.mean()) / 1000.0 if len(greens) else 0.0,
+        "max_green_s": float(greens.max()) / 1000.0 if len(greens) else 0.0,
+        "preemptions": int(np.count_nonzero(kinds == PREEMPT)),
+        "avg_preempt_latency_s": float(latencies.mean()) / 1000.0 if len(latencies) else 0.0,
+    }
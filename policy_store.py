@@ -0,0 +1,220 @@
+# policy_store.py
+#
+# Hot-reloadable, versioned Q-learning policies. A PolicyStore serves every
+# q_table_v<N>.qtab / .json file in a directory (the binary file wins when
+# both exist) and picks up new or rewritten files on refresh(), so a newly
+# trained table goes live without restarting the server.
+#
+# Sessions either pin a version or follow "latest". The loaded versions are
+# one (versions, latest, current policy) tuple that refresh() rebuilds and
+# rebinds in a single assignment: act() reads it without locks, and a swap
+# never shows a half-updated store. Loading a binary table is a memory map
+# (see q_policy.py), so refreshing on the eventlet loop does not stall it.
+#
+# With no versions yet, "latest" uses the default Q-table (QTableController()).
+#
+# Usage:
+#   python3 policy_store.py publish q_table_advanced.json --dir policies
+#   python3 policy_store.py list --dir policies
+#   POLICY_DIR=policies python3 app.py
+
+import argparse
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+import controller_registry
+from controllers import QTableController
+from q_policy import load_policy, save_binary
+
+
+POLICY_FILE = re.compile(r"^q_table_v(\d+)\.(qtab|json)$")
+LATEST = "latest"
+
+Version = Union[int, str]   # a version number or LATEST
+
+
+class VersionedSession:
+    """Decision controller of one simulation on a PolicyStore: a pinned
+    version, or whichever version is latest at each decision."""
+
+    name = "q_learning"
+    deterministic = True   # per policy; TrafficController watches `policy`
+
+    def __init__(self, store: "PolicyStore", version: Version = LATEST):
+        self.store = store
+        self.pin = version if version == LATEST else int(version)
+        # A pinned session keeps its policy even if the file is later removed
+        self._pinned = None if version == LATEST else store.get(version)
+        self.last_reason = ""
+
+    @property
+    def version(self) -> Optional[int]:
+        return self.store.latest_version if self._pinned is None else self.pin
+
+    @property
+    def policy(self) -> QTableController:
+        return self.store.current() if self._pinned is None else self._pinned
+
+    def reset(self) -> None:
+        self.last_reason = ""
+
+    def act(self, qN: int, qS: int, qE: int, qW: int, phase_val: int, green_elapsed_s: int) -> int:
+        policy = self._pinned if self._pinned is not None else self.store._state[2]
+        action, self.last_reason = policy.decide(qN, qS, qE, qW, phase_val, green_elapsed_s)
+        return action
+
+
+class PolicyStore:
+    def __init__(self, directory: str, poll_interval: float = 2.0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        # Writer side only (refresh): file name -> (mtime_ns, size) it was loaded at
+        self._stamps: Dict[str, Tuple[int, int]] = {}
+        self._failed: Dict[str, Tuple[int, int]] = {}   # same, for files that did not load
+        self._loaded: Dict[int, Tuple[str, QTableController]] = {}
+        # Reader side: (version -> policy, latest version, latest policy)
+        self._state: Tuple[Dict[int, QTableController], Optional[int], QTableController] = (
+            {}, None, controller_registry.get_policy("q_learning"))
+        self.refresh()
+
+    # --- Reading ------------------------------------------------------------------
+    def versions(self) -> List[int]:
+        return sorted(self._state[0])
+
+    @property
+    def latest_version(self) -> Optional[int]:
+        return self._state[1]
+
+    def current(self) -> QTableController:
+        return self._state[2]
+
+    def get(self, version: Version = LATEST) -> QTableController:
+        if version == LATEST:
+            return self._state[2]
+        policy = self._state[0].get(int(version))
+        if policy is None:
+            raise ValueError(f"policy version {version} not in {self.directory} (have {self.versions()})")
+        return policy
+
+    def create_session(self, version: Version = LATEST) -> VersionedSession:
+        return VersionedSession(self, version)
+
+    # --- Reloading ----------------------------------------------------------------
+    def _scan(self) -> Dict[int, str]:
+        """version -> file name, preferring .qtab over .json."""
+        files: Dict[int, str] = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                match = POLICY_FILE.match(entry.name)
+                if match and entry.is_file():
+                    version = int(match.group(1))
+                    if version not in files or match.group(2) == "qtab":
+                        files[version] = entry.name
+        return files
+
+    def refresh(self) -> bool:
+        """Loads new and changed policy files and drops removed ones.
+        Returns True if the served versions changed.
+
+        A file that fails to load (still being written, wrong
+        discretization) is retried next time; its previous version, if
+        any, stays in service.
+        """
+        files = self._scan()
+        loaded = {version: entry for version, entry in self._loaded.items() if version in files}
+        changed = len(loaded) != len(self._loaded)
+
+        for version, name in files.items():
+            st = os.stat(os.path.join(self.directory, name))
+            stamp = (st.st_mtime_ns, st.st_size)
+            if version in loaded and loaded[version][0] == name and self._stamps.get(name) == stamp:
+                continue
+            if self._failed.get(name) == stamp:
+                continue
+            try:
+                policy = QTableController(os.path.join(self.directory, name))
+            except (OSError, ValueError) as e:
+                print(f"policy_store: skipping {name}: {e}")
+                self._failed[name] = stamp
+                continue
+            loaded[version] = (name, policy)
+            self._stamps[name] = stamp
+            changed = True
+
+        if changed:
+            self._loaded = loaded
+            versions = {version: policy for version, (_, policy) in loaded.items()}
+            latest = max(versions) if versions else None
+            current = versions[latest] if versions else controller_registry.get_policy("q_learning")
+            self._state = (versions, latest, current)   # the one swap readers see
+        return changed
+
+    def watch(self, sleep: Callable[[float], None] = time.sleep, stop: Optional[Callable[[], bool]] = None) -> None:
+        """Refreshes every poll_interval seconds until stop() is true. Pass
+        socketio.sleep / eventlet.sleep as `sleep` to run it as a green thread."""
+        while stop is None or not stop():
+            sleep(self.poll_interval)
+            try:
+                self.refresh()
+            except OSError as e:   # directory briefly missing during a deploy
+                print(f"policy_store: refresh failed: {e}")
+
+    # --- Publishing ---------------------------------------------------------------
+    def publish(self, q_values: np.ndarray, source: str = "") -> int:
+        """Writes q_values as the next version (binary, atomic rename) and loads it."""
+        files = self._scan()
+        version = max(files) + 1 if files else 1
+        save_binary(os.path.join(self.directory, f"q_table_v{version}.qtab"), q_values, source=source)
+        self.refresh()
+        return version
+
+
+# --- Process-wide store ---------------------------------------------------------
+_active: Optional[PolicyStore] = None
+
+
+def configure(directory: Optional[str], poll_interval: float = 2.0) -> Optional[PolicyStore]:
+    """Serves the q_learning controller from `directory` (sessions take a
+    version= parameter, default "latest"); None goes back to the fixed
+    default Q-table."""
+    global _active
+    if directory is None:
+        _active = None
+        controller_registry.register_sessions("q_learning", None)
+        return None
+    os.makedirs(directory, exist_ok=True)
+    _active = PolicyStore(directory, poll_interval)
+    controller_registry.register_sessions("q_learning", _active.create_session)
+    return _active
+
+
+def active_store() -> Optional[PolicyStore]:
+    return _active
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned Q-learning policy store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    publish = sub.add_parser("publish", help="add a Q-table (JSON or binary) as the next version")
+    publish.add_argument("path")
+    publish.add_argument("--dir", default="policies")
+    listing = sub.add_parser("list", help="list the versions in a store")
+    listing.add_argument("--dir", default="policies")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    store = PolicyStore(args.dir)
+    if args.command == "publish":
+        version = store.publish(load_policy(args.path).q_values, source=os.path.basename(args.path))
+        print(f"{args.path} -> {args.dir}/q_table_v{version}.qtab")
+    else:
+        for version in store.versions():
+            print(f"v{version}: {store._loaded[version][0]}" + ("  (latest)" if version == store.latest_version else ""))
+
+
+if __name__ == "__main__":
+    main()
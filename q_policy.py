@@ -0,0 +1,209 @@
+# q_policy.py
+#
+# Q-table policies for QTableController: the mixed-radix state encoding, a
+# compact binary file format and a process-wide loading cache.
+#
+# The JSON table (q_table_advanced.json) costs a parse of ~1000 string keys
+# per load. The binary file is a small header plus the dense arrays, and
+# loads by memory-mapping: the OS shares the pages between worker processes,
+# and load_policy() hands every controller in a process the same read-only
+# policy until the file changes on disk.
+#
+# Binary layout:
+#   MAGIC | uint16 version | uint32 header length | JSON header, padded to 64 bytes
+#   q_values  float64 (N_STATES, 2)
+#   actions   int8 (N_STATES,), greedy action per state
+# The header records the discretization, so a table trained with other
+# buckets is rejected instead of silently misread.
+#
+# Usage:
+#   python3 q_policy.py convert q_table_advanced.json q_table_advanced.qtab
+#   python3 q_policy.py info q_table_advanced.qtab
+
+import argparse
+import json
+import os
+import struct
+from typing import Dict, Mapping, Sequence, Tuple
+
+import numpy as np
+
+
+# State (qN, qS, qE, qW, phase, green, diff) as one mixed-radix integer: the
+# digits are the buckets of q_learning_env_advanced.py, with diff (-1/0/1)
+# shifted to 0-2.
+STATE_DIGITS = ("qN", "qS", "qE", "qW", "phase", "green", "diff")
+STATE_RADIX = (3, 3, 3, 3, 2, 3, 3)
+N_STATES = int(np.prod(STATE_RADIX))     # 1458
+N_ACTIONS = 2                            # keep, switch
+
+# Bucket upper bounds (inclusive), as in q_learning_env_advanced.discretize_*
+BUCKETS = {"queue": [2, 5], "green": [3, 8], "diff": [-3, 3]}
+
+DEFAULT_JSON = "q_table_advanced.json"
+DEFAULT_BINARY = "q_table_advanced.qtab"
+
+MAGIC = b"TLQTAB\x00\x00"
+VERSION = 1
+_PREFIX = struct.Struct("<8sHI")
+_ALIGN = 64
+
+
+def encode_state(state: Sequence[int]) -> int:
+    """Index of a Q-table state tuple (diff as -1/0/1, like the JSON keys)."""
+    index = 0
+    for digit, radix in zip(state[:6], STATE_RADIX):
+        index = index * radix + int(digit)
+    return index * 3 + int(state[6]) + 1
+
+
+def q_values_from_table(table: Mapping[Tuple[int, ...], Sequence[float]]) -> np.ndarray:
+    """Dense (N_STATES, 2) array from {state tuple: [keep, switch]}; missing states are 0."""
+    q_values = np.zeros((N_STATES, N_ACTIONS))
+    for state, values in table.items():
+        q_values[encode_state(state)] = values
+    return q_values
+
+
+def greedy_actions(q_values: np.ndarray) -> np.ndarray:
+    """0 (keep) unless switching has the strictly larger value."""
+    return (q_values[:, 1] > q_values[:, 0]).astype(np.int8)
+
+
+class QPolicy:
+    """Read-only Q-values and greedy actions of one policy file."""
+
+    def __init__(self, q_values: np.ndarray, actions: np.ndarray, path: str = ""):
+        q_values.setflags(write=False)
+        actions.setflags(write=False)
+        self.q_values = q_values
+        self.actions = actions
+        self.greedy = actions.tolist()  # plain ints for the scalar act() lookup
+        self.path = path
+
+
+# --- Files --------------------------------------------------------------------
+def read_json(path: str) -> QPolicy:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    # keys are strings like "(0, 1, 0, 2, 0, 1, -1)"
+    table = {tuple(int(x) for x in key.strip("()").split(",")): values for key, values in raw.items()}
+    q_values = q_values_from_table(table)
+    return QPolicy(q_values, greedy_actions(q_values), path)
+
+
+def save_binary(path: str, q_values: np.ndarray, source: str = "") -> None:
+    q_values = np.ascontiguousarray(q_values, dtype="<f8")
+    if q_values.shape != (N_STATES, N_ACTIONS):
+        raise ValueError(f"expected Q-values of shape {(N_STATES, N_ACTIONS)}, got {q_values.shape}")
+    actions = greedy_actions(q_values)
+
+    header = {
+        "version": VERSION,
+        "digits": list(STATE_DIGITS),
+        "radix": list(STATE_RADIX),
+        "buckets": BUCKETS,
+        "n_states": N_STATES,
+        "n_actions": N_ACTIONS,
+        "source": source,
+    }
+    # Data starts at a multiple of _ALIGN; the header is padded with spaces
+    size = _PREFIX.size + len(json.dumps(header))
+    header["data_offset"] = -(-(size + 32) // _ALIGN) * _ALIGN
+    encoded = json.dumps(header).encode()
+    encoded += b" " * (header["data_offset"] - _PREFIX.size - len(encoded))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        f.write(q_values.tobytes())
+        f.write(actions.tobytes())
+    os.replace(tmp, path)   # readers never see a half-written file
+
+
+def read_header(path: str) -> Dict:
+    with open(path, "rb") as f:
+        magic, version, size = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a binary Q-table")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported Q-table version {version} (expected {VERSION})")
+        return json.loads(f.read(size))
+
+
+def read_binary(path: str) -> QPolicy:
+    header = read_header(path)
+    if header["radix"] != list(STATE_RADIX) or header["buckets"] != BUCKETS:
+        raise ValueError(f"{path}: Q-table discretization {header['radix']} / {header['buckets']} "
+                         f"does not match this controller's {list(STATE_RADIX)} / {BUCKETS}")
+    offset = header["data_offset"]
+    q_values = np.memmap(path, dtype="<f8", mode="r", offset=offset, shape=(N_STATES, N_ACTIONS))
+    actions = np.memmap(path, dtype=np.int8, mode="r", offset=offset + q_values.nbytes, shape=(N_STATES,))
+    return QPolicy(q_values, actions, path)
+
+
+def is_binary(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def convert_json(json_path: str, binary_path: str) -> None:
+    save_binary(binary_path, read_json(json_path).q_values, source=os.path.basename(json_path))
+
+
+# --- Shared loading -----------------------------------------------------------------
+# realpath -> ((mtime_ns, size), policy)
+_cache: Dict[str, Tuple[Tuple[int, int], QPolicy]] = {}
+
+
+def load_policy(path: str) -> QPolicy:
+    """The policy in `path` (binary or JSON, detected from the contents).
+
+    Cached per process: every caller gets the same read-only QPolicy until
+    the file's modification time or size changes.
+    """
+    key = os.path.realpath(path)
+    st = os.stat(key)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    policy = read_binary(key) if is_binary(key) else read_json(key)
+    _cache[key] = (stamp, policy)
+    return policy
+
+
+def clear_cache() -> None:
+    _cache.clear()
+
+
+def default_policy_path() -> str:
+    """The binary table when it has been generated from the current JSON one
+    (not older than it), otherwise the JSON table."""
+    if os.path.exists(DEFAULT_BINARY) and (
+            not os.path.exists(DEFAULT_JSON) or os.path.getmtime(DEFAULT_BINARY) >= os.path.getmtime(DEFAULT_JSON)):
+        return DEFAULT_BINARY
+    return DEFAULT_JSON
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Q-table policy files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="convert a JSON Q-table to the binary format")
+    convert.add_argument("json_path")
+    convert.add_argument("binary_path", nargs="?", default=DEFAULT_BINARY)
+    info = sub.add_parser("info", help="print a binary Q-table's header")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert_json(args.json_path, args.binary_path)
+        print(f"{args.json_path} -> {args.binary_path} ({os.path.getsize(args.binary_path)} bytes)")
+    else:
+        print(json.dumps(read_header(args.path), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,26 @@
-import sys
+import argparse
 import os
 import time
-os.environ['SDL_VIDEODRIVER'] = 'dummy'
 
-import pygame
-from simulation import TrafficSimulation
+from simulation_core import SimulationCore
+from metrics_io import default_format, have_pyarrow
+
+parser = argparse.ArgumentParser(description="Run all controllers under several traffic loads.")
+parser.add_argument("--trace", help="replay a detector trace (CSV or .npy, see trace_arrivals.py) "
+                                    "as a single 'trace' load instead of the synthetic loads")
+parser.add_argument("--duration", type=float, default=120, help="simulated seconds per run with --trace")
+parser.add_argument("--sample-interval", type=float, default=None, metavar="MS",
+                    help="one aggregated metrics row per window of MS milliseconds (default: every tick)")
+parser.add_argument("--format", choices=["csv", "parquet", "npz", "auto"], default="csv",
+                    help="metrics file format; auto = parquet if pyarrow is installed, else npz")
+parser.add_argument("--arrivals", choices=["legacy", "uniform_jitter", "poisson"], default="legacy",
+                    help="arrival model; uniform_jitter / poisson pre-draw the arrivals from seed 0 so every "
+                         "controller sees the same ones, but give a different load than legacy (see arrivals.py)")
+args = parser.parse_args()
+if args.format == "parquet" and not have_pyarrow():
+    parser.error("--format parquet needs pyarrow (pip install pyarrow); use --format npz or csv")
+
+file_format = default_format() if args.format == "auto" else args.format
 
 os.makedirs("metrics", exist_ok=True)
 
@@ -13,8 +29,13 @@ configs = [
     {"name": "normal", "spawn_rate": 2.0, "duration": 120},
     {"name": "heavy", "spawn_rate": 1.0, "duration": 120},
 ]
+if args.trace:
+    configs = [{"name": "trace", "spawn_rate": 2.0, "duration": args.duration}]
 
 controllers = ["actuated", "max_pressure", "q_learning"]
+# None keeps the legacy per-tick spawn check
+arrival_model = None if args.arrivals == "legacy" else args.arrivals
+seed = 0
 
 print("="*60)
 print("MULTI-LOAD TRAFFIC SIMULATION EXPERIMENT")
@@ -32,33 +53,26 @@ for config in configs:
     for ctrl in controllers:
         print(f"  Running {ctrl}...", end=" ", flush=True)
 
-        pygame.init()
-        sim = TrafficSimulation()
-        sim.controller_name = ctrl
-        sim._apply_controller(ctrl)
-        sim.spawn_rate = spawn_rate
+        sim = SimulationCore(controller_name=ctrl, spawn_rate=spawn_rate, arrivals=arrival_model, seed=seed,
+                             trace=args.trace, sample_interval_ms=args.sample_interval)
 
         start_time = time.time()
-        while sim.current_time < duration_s * 1000 and sim.running:
-            delta_time = 16.67
-            sim.update(delta_time)
+        sim.run(duration_s, delta_time=16.67, fast_forward=True)
 
         elapsed = time.time() - start_time
 
-        filename = f"metrics/metrics_{ctrl}_{load_name}.csv"
+        filename = f"metrics/metrics_{ctrl}_{load_name}.{file_format}"
         sim.export_metrics(filename)
 
         print(f"done ({elapsed:.1f}s real-time)")
 
-        pygame.quit()
-
 print("\n" + "="*60)
 print("EXPERIMENT COMPLETE")
 print("="*60)
 print("\nGenerated files in metrics/ folder:")
 for config in configs:
     for ctrl in controllers:
-        print(f"  - metrics_{ctrl}_{config['name']}.csv")
+        print(f"  - metrics_{ctrl}_{config['name']}.{file_format}")
 
 print("\nNext step:")
 print("  Run: python analyze_multiload.py")
@@ -1,18 +1,15 @@
 # simulation.py
 import sys
-import random
 from typing import Dict
 
 import pygame
 
 from models import Direction, LightState, Car
-from traffic_controller import TrafficController
-from car_manager import CarManager
-from controllers import ActuatedThresholdController, MaxPressureController, QTableController
+from simulation_core import SimulationCore, core_property
 
 
 class TrafficSimulation:
-    def __init__(self, width: int = 1200, height: int = 900):
+    def __init__(self, width: int = 1200, height: int = 900, engine: str = "python"):
         # Window size and game setup
         self.width = width
         self.height = height
@@ -26,29 +23,8 @@ class TrafficSimulation:
         self.font_medium = pygame.font.Font(None, 20)
         self.font_small = pygame.font.Font(None, 16)
 
-        # Main controllers
-        self.traffic_controller = TrafficController()  # manages traffic lights
-        self.car_manager = CarManager()                # creates and moves cars
-
-        # Controller modes
-        self.controller_name = "actuated"
-        self._apply_controller(self.controller_name)
-
-        self.metrics = {
-            "time": [],
-            "qN": [],
-            "qS": [],
-            "qE": [],
-            "qW": [],
-            "total_queue": [],
-            "vip_queue": [],
-            "phase": [],
-            "avg_wait": []
-        }
-
-        self.spawn_rate = 2.0
-        self.last_spawn_time = 0
-        self.current_time = 0
+        # Headless simulation: spawning, lights, cars and metrics
+        self.core = SimulationCore(engine=engine)
 
         self.running = True
 
@@ -86,6 +62,16 @@ class TrafficSimulation:
                 elif event.key == pygame.K_m:
                     self.export_current_metrics()
 
+                # Tick profiling: P starts it, pressing again prints the stage table
+                elif event.key == pygame.K_p:
+                    profiler = self.core.profiler
+                    if profiler.enabled:
+                        profiler.disable()
+                        profiler.dump()
+                    else:
+                        profiler.reset()
+                        profiler.enable()
+
                 # Optional: manually spawn VIP cars for testing
                 elif event.key == pygame.K_n:
                     self.car_manager.spawn_car(Direction.NORTH, force_vip=True)
@@ -96,34 +82,20 @@ class TrafficSimulation:
                 elif event.key == pygame.K_w:
                     self.car_manager.spawn_car(Direction.WEST, force_vip=True)
 
-    def reset(self) -> None:
-        self.traffic_controller = TrafficController()
-        self._apply_controller(self.controller_name)
-        self.car_manager = CarManager()
-        self.last_spawn_time = 0
-        self.current_time = 0
-
-        self.metrics = {
-            "time": [], "qN": [], "qS": [], "qE": [], "qW": [],
-            "total_queue": [], "vip_queue": [], "phase": [], "avg_wait": []
-        }
+    # State owned by the headless core
+    traffic_controller = core_property("traffic_controller")
+    car_manager = core_property("car_manager")
+    controller_name = core_property("controller_name")
+    spawn_rate = core_property("spawn_rate")
+    current_time = core_property("current_time")
+    metrics = core_property("metrics")
 
+    def reset(self) -> None:
+        self.core.reset()
 
     def _apply_controller(self, name: str) -> None:
         """Attach the selected controller to the TrafficController."""
-        name = (name or "actuated").lower()
-        self.controller_name = name
-
-        if name == "actuated":
-            self.traffic_controller.set_controller(ActuatedThresholdController())
-        elif name == "max_pressure":
-            self.traffic_controller.set_controller(MaxPressureController())
-        elif name == "q_learning":
-            self.traffic_controller.set_controller(QTableController("q_table_advanced.json"))
-        else:
-            # default fallback
-            self.traffic_controller.set_controller(ActuatedThresholdController())
-            self.controller_name = "actuated"
+        self.core.apply_controller(name)
 
     def export_current_metrics(self) -> None:
         import os
@@ -233,7 +205,7 @@ class TrafficSimulation:
                                  horizontal=True )
 
         # Draw every car on screen
-        for car in self.car_manager.get_cars():
+        for car in self.car_manager.iter_cars():
             self.draw_car(car, center_x, center_y)
 
         # Compass labels (N/S/E/W)
@@ -323,67 +295,23 @@ class TrafficSimulation:
             ("max_pressure", "2 – Max-pressure"),
             ("q_learning", "3 – Q-learning"),
             ("export", "M – Export metrics"),
+            ("profile", "P – Profile ticks (again: print)"),
         ]
     
         line_gap = 14
         for key, label in controls:
             color = active_color if key == active else normal_color
-            if key == "export":
+            if key in ("export", "profile"):
                 color = normal_color
             txt = self.font_tiny.render(label, True, color)
             self.screen.blit(txt, (panel_x + 10, y_offset))
             y_offset += line_gap
 
     def update(self, delta_time: float) -> None:
-        self.current_time += delta_time
-
-        if self.current_time - self.last_spawn_time > self.spawn_rate * 1000 + random.random() * 1000:
-            direction = random.choice(list(Direction))
-            self.car_manager.spawn_car(direction, current_time=self.current_time)
-            self.last_spawn_time = self.current_time
-
-        queue_stats = {d: self.car_manager.get_queue_count(d) for d in Direction}
-        vip_queue_stats = {d: self.car_manager.get_vip_queue_count(d) for d in Direction}
-
-        self.traffic_controller.update(queue_stats, vip_queue_stats, delta_time)
-
-        self.car_manager.update_cars(
-            lambda d: self.traffic_controller.get_light_state(d),
-            delta_time,
-            self.current_time
-        )
-
-        total_queue = sum(queue_stats.values())
-        vip_total_queue = sum(vip_queue_stats.values())
-
-        self.metrics["time"].append(self.current_time / 1000.0)
-        self.metrics["qN"].append(queue_stats[Direction.NORTH])
-        self.metrics["qS"].append(queue_stats[Direction.SOUTH])
-        self.metrics["qE"].append(queue_stats[Direction.EAST])
-        self.metrics["qW"].append(queue_stats[Direction.WEST])
-        self.metrics["total_queue"].append(total_queue)
-        self.metrics["vip_queue"].append(vip_total_queue)
-        self.metrics["phase"].append(self.traffic_controller.current_phase)
-        self.metrics["avg_wait"].append(self.car_manager.get_avg_wait_time())
+        self.core.update(delta_time)
 
     def export_metrics(self, filename="metrics.csv"):
-        import csv
-        with open(filename, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["time_s", "qN", "qS", "qE", "qW", "total_queue", "vip_queue", "phase", "avg_wait"])
-            for i in range(len(self.metrics["time"])):
-                writer.writerow([
-                    self.metrics["time"][i],
-                    self.metrics["qN"][i],
-                    self.metrics["qS"][i],
-                    self.metrics["qE"][i],
-                    self.metrics["qW"][i],
-                    self.metrics["total_queue"][i],
-                    self.metrics["vip_queue"][i],
-                    self.metrics["phase"][i],
-                    self.metrics["avg_wait"][i]
-                ])
-
+        self.core.export_metrics(filename)
 
     def draw(self) -> None:
         """Clears the screen and redraws everything."""
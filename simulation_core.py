@@ -0,0 +1,342 @@
+# simulation_core.py
+#
+# Headless simulation loop: spawning, TrafficController, CarManager and metrics.
+# Shared by the pygame front-end (simulation.py), the web server (app.py)
+# and the batch experiment scripts. Must not import pygame.
+
+import random
+from time import perf_counter_ns
+from typing import Dict, Optional
+
+import numpy as np
+
+from models import Direction, DIRECTIONS
+from arrivals import ArrivalSchedule
+from trace_arrivals import TraceArrivals
+from traffic_controller import TrafficController
+from controller_registry import DEFAULT_CONTROLLER, available, create_session
+from car_manager import CarManager
+from lane_engine import ENGINES
+from metrics import MetricsRecorder, WindowedMetrics
+from metrics_io import save_metrics
+from phase_log import events_path, save_events
+from trajectory import TrajectoryRecorder
+from profiling import StageProfiler
+
+
+# Stages of update() timed by the profiler; "tick" is the whole update
+STAGES = ("spawn", "queues", "controller", "cars", "metrics", "tick")
+
+# Fast-forward looks FAST_FORWARD_SPAN ticks ahead, doubling up to
+# MAX_FAST_FORWARD_SPAN while nothing happens. A jump shorter than
+# FAST_FORWARD_MIN_SKIP ticks costs more than it saves, so after one it
+# steps up to FAST_FORWARD_RETRY ticks before looking again.
+FAST_FORWARD_SPAN = 32
+MAX_FAST_FORWARD_SPAN = 4096
+FAST_FORWARD_MIN_SKIP = 12
+FAST_FORWARD_RETRY = 31
+
+
+def core_property(name: str) -> property:
+    """Property that forwards to self.core.<name>, for front-ends wrapping a SimulationCore."""
+    def fget(self):
+        return getattr(self.core, name)
+
+    def fset(self, value):
+        setattr(self.core, name, value)
+
+    return property(fget, fset)
+
+
+class SimulationCore:
+    def __init__(self, controller_name: str = "actuated", spawn_rate: float = 2.0,
+                 engine: str = "python", record_metrics: bool = True, integrator: str = "tick",
+                 arrivals: Optional[str] = None, seed: Optional[int] = None,
+                 direction_rates: Optional[Dict[Direction, float]] = None, trace: Optional[str] = None,
+                 sample_interval_ms: Optional[float] = None, trajectory: Optional[str] = None,
+                 trajectory_decimation: int = 1, profile: bool = False,
+                 lane_length: float = CarManager.DEFAULT_LANE_LENGTH):
+        self.engine = engine                    # "python" or "vectorized" (see lane_engine.py)
+        self.integrator = integrator            # "tick" or "continuous" (see CarManager)
+        self.lane_length = lane_length          # spawn to exit; the front-ends draw the default 600
+        self.record_metrics = record_metrics    # the web server does not keep metrics
+        self.controller_name = controller_name
+        # Per-controller session parameters, kept across resets and controller
+        # switches (e.g. {"q_learning": {"version": 3}}, see policy_store.py)
+        self.controller_params: Dict[str, Dict] = {}
+        self._spawn_rate = spawn_rate           # seconds between spawns (plus up to 1s jitter)
+
+        # Arrival model (see arrivals.py): None keeps the legacy per-tick
+        # random check; "uniform_jitter" / "poisson" pre-draw the arrivals
+        # from `seed`, so the run is reproducible from that seed alone.
+        # `trace` replays a recorded detector file instead (see trace_arrivals.py).
+        self.arrivals = None
+        if trace is not None:
+            self.arrivals = TraceArrivals(trace, seed=seed)
+        elif arrivals is not None:
+            self.arrivals = ArrivalSchedule(spawn_rate, arrivals, seed=seed, direction_rates=direction_rates)
+        # One metrics row per tick, or per sample_interval_ms window (see metrics.py).
+        # Reused across resets.
+        if sample_interval_ms:
+            self.metrics = WindowedMetrics(sample_interval_ms)
+        else:
+            self.metrics = MetricsRecorder()
+        # Per-car trajectory file, off by default (see trajectory.py).
+        # Each reset starts the file over.
+        self.trajectory = trajectory
+        self.trajectory_decimation = trajectory_decimation
+        self.trajectory_recorder: Optional[TrajectoryRecorder] = None
+        # Per-stage tick timing (see profiling.py); switch with
+        # profiler.enable() / disable(). Kept across resets.
+        self.profiler = StageProfiler(STAGES, enabled=profile, total="tick")
+        self.reset()
+
+    @property
+    def spawn_rate(self) -> float:
+        return self._spawn_rate
+
+    @spawn_rate.setter
+    def spawn_rate(self, value: float) -> None:
+        self._spawn_rate = value
+        if self.arrivals is not None:
+            self.arrivals.set_spawn_rate(value, self.current_time)
+
+    @property
+    def policy_version(self) -> Optional[int]:
+        """Version of the versioned policy deciding (policy_store.py), else None."""
+        return getattr(self.traffic_controller.decision_controller, "version", None)
+
+    def reset(self) -> None:
+        self.traffic_controller = TrafficController()   # manages traffic lights
+        self.apply_controller(self.controller_name)
+        self.car_manager = ENGINES[self.engine](integrator=self.integrator,    # creates and moves cars
+                                                lane_length=self.lane_length)
+        if self.trajectory is not None:
+            self.close()
+            self.trajectory_recorder = TrajectoryRecorder(self.trajectory, self.trajectory_decimation)
+            self.car_manager.recorder = self.trajectory_recorder
+        if self.arrivals is not None:
+            self.arrivals.reset()
+        self.last_spawn_time = 0
+        self.current_time = 0
+        self.metrics.reset()
+
+    def apply_controller(self, name: str, **params) -> None:
+        """Attach the selected controller to the TrafficController. `params`
+        replace the controller's stored session parameters."""
+        name = (name or DEFAULT_CONTROLLER).lower()
+        if params:
+            self.controller_params[name] = params
+        params = self.controller_params.get(name, {})
+        try:
+            session = create_session(name, **params)
+        except (TypeError, ValueError) as e:
+            session = None
+            if params and name in available():
+                # Stored parameters the controller can't honour right now, e.g. a
+                # pinned policy version with no store configured or whose file
+                # is gone: keep the controller on its defaults ("latest")
+                print(f"Controller {name}: ignoring {params} ({e})")
+                session = create_session(name)
+        if session is None:
+            # default fallback
+            name = DEFAULT_CONTROLLER
+            session = create_session(name)
+        self.controller_name = name
+        self.traffic_controller.set_controller(session)
+
+    def update(self, delta_time: float) -> None:
+        """Advances the simulation by delta_time milliseconds."""
+        if self.profiler.enabled:
+            self._update_profiled(delta_time)
+            return
+
+        self.current_time += delta_time
+        self._spawn_cars()
+
+        queue_stats, vip_queue_stats = self._queue_stats()
+
+        self.traffic_controller.update(queue_stats, vip_queue_stats, delta_time)
+
+        self.car_manager.update_cars(
+            self.traffic_controller.get_light_state,
+            delta_time,
+            self.current_time
+        )
+
+        if self.record_metrics:
+            self._record(queue_stats, vip_queue_stats)
+
+    def _update_profiled(self, delta_time: float) -> None:
+        """update() with every stage timed into self.profiler (see STAGES)."""
+        add = self.profiler.add
+        clock = perf_counter_ns
+
+        start = clock()
+        self.current_time += delta_time
+        self._spawn_cars()
+        t_spawn = clock()
+        queue_stats, vip_queue_stats = self._queue_stats()
+        t_queues = clock()
+        self.traffic_controller.update(queue_stats, vip_queue_stats, delta_time)
+        t_controller = clock()
+        self.car_manager.update_cars(self.traffic_controller.get_light_state, delta_time, self.current_time)
+        t_cars = clock()
+        if self.record_metrics:
+            self._record(queue_stats, vip_queue_stats)
+        end = clock()
+
+        add("spawn", t_spawn - start)
+        add("queues", t_queues - t_spawn)
+        add("controller", t_controller - t_queues)
+        add("cars", t_cars - t_controller)
+        add("metrics", end - t_cars)
+        add("tick", end - start)
+
+    def _queue_stats(self):
+        queue_stats = {d: self.car_manager.get_queue_count(d) for d in Direction}
+        vip_queue_stats = {d: self.car_manager.get_vip_queue_count(d) for d in Direction}
+        return queue_stats, vip_queue_stats
+
+    def _spawn_cars(self) -> None:
+        """Spawns the arrivals due this tick (legacy: random check, once per tick)."""
+        if self.arrivals is not None:
+            lanes, is_vip, color_idx = self.arrivals.pop_due(self.current_time)
+            for lane, vip, color in zip(lanes.tolist(), is_vip.tolist(), color_idx.tolist()):
+                self.spawn(DIRECTIONS[lane], force_vip=vip, color_idx=color)
+        elif self.current_time - self.last_spawn_time > self.spawn_rate * 1000 + random.random() * 1000:
+            self.spawn(random.choice(DIRECTIONS))
+
+    def spawn(self, direction: Direction, force_vip: bool = False, color_idx: Optional[int] = None) -> None:
+        self.car_manager.spawn_car(direction, force_vip=force_vip, current_time=self.current_time,
+                                   color_idx=color_idx)
+        self.last_spawn_time = self.current_time
+
+    def _record(self, queue_stats, vip_queue_stats) -> None:
+        self.metrics.append(
+            self.current_time / 1000.0,
+            queue_stats[Direction.NORTH],
+            queue_stats[Direction.SOUTH],
+            queue_stats[Direction.EAST],
+            queue_stats[Direction.WEST],
+            sum(queue_stats.values()),
+            sum(vip_queue_stats.values()),
+            self.traffic_controller.current_phase,
+            self.car_manager.get_avg_wait_time(),
+        )
+
+    def run(self, duration_s: float, delta_time: float = 16.67, fast_forward: bool = False) -> None:
+        """Steps the simulation at a fixed delta_time until duration_s has elapsed.
+
+        With fast_forward=True, stretches where nothing happens but cars
+        moving steadily are skipped in one jump each (see _fast_forward).
+        Results are identical to plain stepping.
+        """
+        end_time = duration_s * 1000
+        wait = retry = 0
+        while self.current_time < end_time:
+            if fast_forward:
+                if wait:
+                    wait -= 1
+                else:
+                    skipped = self._fast_forward(delta_time, end_time)
+                    if skipped >= FAST_FORWARD_MIN_SKIP:
+                        retry = 0
+                    else:
+                        # Busy road: step 0, 1, 3, 7 ... ticks before looking again
+                        wait = retry
+                        retry = min(2 * retry + 1, FAST_FORWARD_RETRY)
+                    if skipped:
+                        continue
+            self.update(delta_time)
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.flush()
+
+    def _fast_forward(self, delta_time: float, end_time: float) -> int:
+        """Jumps to the next tick where something happens. Returns the ticks skipped.
+
+        The span ends before the earliest of: the next arrival (with the
+        legacy check, spawn_rate seconds after the last spawn), the active
+        green/yellow timing out, min-green expiry or a controller decision to
+        switch (see TrafficController.quiet_ticks), and a car crossing the
+        stop line, committing, leaving or changing how it moves (see
+        CarManager.coast). Until then the queues, the lights and the average
+        wait stay as they are, so the skipped ticks' metric rows are known;
+        the cars are coasted with the same float operations as update().
+        Spans are looked at FAST_FORWARD_SPAN ticks at a time, doubling while
+        nothing happens.
+        """
+        tc = self.traffic_controller
+        if self.arrivals is not None:
+            next_arrival = self.arrivals.next_time()
+        else:
+            spawn_earliest = self.spawn_rate * 1000
+            next_arrival = self.last_spawn_time + spawn_earliest
+        cars = self.car_manager.get_car_count()
+        if cars and next_arrival - self.current_time < FAST_FORWARD_MIN_SKIP * delta_time:
+            return 0    # not worth coasting the cars for
+        queue_stats, vip_queue_stats = self._queue_stats()
+
+        skipped = 0
+        span = FAST_FORWARD_SPAN
+        while self.current_time < end_time:
+            # Same float additions as update() / TrafficController.update()
+            times = np.add.accumulate(np.concatenate(([self.current_time], np.full(span, delta_time))))
+            sim_times = np.add.accumulate(np.concatenate(([tc.simulated_time], np.full(span, delta_time))))
+            ticks = int(np.count_nonzero(times[:-1] < end_time))
+            times, sim_times = times[1:ticks + 1], sim_times[1:ticks + 1]
+
+            if self.arrivals is not None:
+                spawn_due = times >= next_arrival
+            else:
+                spawn_due = times - self.last_spawn_time > spawn_earliest
+            if spawn_due.any():
+                ticks = int(np.argmax(spawn_due))
+            ticks = tc.quiet_ticks(queue_stats, vip_queue_stats, sim_times[:ticks])
+            if cars and not skipped and ticks < FAST_FORWARD_MIN_SKIP:
+                break   # not worth coasting the cars for
+            if ticks:
+                ticks = self.car_manager.coast(tc.get_light_state, delta_time, ticks)
+            if ticks == 0:
+                break
+
+            if self.record_metrics:
+                self.metrics.extend(
+                    ticks, time=times[:ticks] / 1000.0,
+                    qN=queue_stats[Direction.NORTH], qS=queue_stats[Direction.SOUTH],
+                    qE=queue_stats[Direction.EAST], qW=queue_stats[Direction.WEST],
+                    total_queue=sum(queue_stats.values()), vip_queue=sum(vip_queue_stats.values()),
+                    phase=tc.current_phase, avg_wait=self.car_manager.get_avg_wait_time())
+            self.current_time = float(times[ticks - 1])
+            tc.skip_to(float(sim_times[ticks - 1]))
+            if self.trajectory_recorder is not None:
+                self.trajectory_recorder.skip(ticks)    # only an empty road coasts while recording
+            if self.arrivals is None:
+                # random.random() consumes two 32-bit Mersenne Twister words, and so
+                # does every 64 bits of getrandbits(): keeps the random stream in sync.
+                random.getrandbits(64 * ticks)
+
+            skipped += ticks
+            if ticks < len(times):
+                break
+            span = min(2 * span, MAX_FAST_FORWARD_SPAN)
+        return skipped
+
+    def export_metrics(self, filename="metrics.csv") -> str:
+        """Writes the metrics as CSV, Parquet or npz by extension (see metrics_io.py),
+        and the signal's event log next to them (see phase_log.events_path)."""
+        path = save_metrics(self.metrics, filename)
+        save_events(self.traffic_controller.events, events_path(path))
+        return path
+
+    def fork(self, controller_name: Optional[str] = None) -> "SimulationCore":
+        """Independent copy of the current state, optionally with another
+        decision controller (see snapshot.py)."""
+        from snapshot import capture, restore
+
+        return restore(capture(self), controller_name)
+
+    def close(self) -> None:
+        """Finishes the trajectory file, if one is being recorded."""
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.close()
@@ -0,0 +1,437 @@
+# snapshot.py
+#
+# Versioned binary snapshots of a whole SimulationCore: cars, signal timers
+# and phase, event log, spawn clock, arrival cursor and RNG states, wait-time
+# statistics and metric rows. Restoring one continues the run exactly as if
+# it had never stopped, so a warmed-up state can be forked into several
+# controller variants instead of re-simulating the warm-up for each.
+#
+# No pickle: the file is
+#   MAGIC | uint16 version | uint32 header length | JSON header | array data
+# where the header holds the scalar state and, for every array, its dtype,
+# shape and offset into the array data.
+#
+# Not captured: trajectory recording and the profiler (forks start without
+# them). The legacy spawn check (arrivals=None) draws from the global
+# `random` module; restoring sets its state, which every core in the process
+# shares, so run legacy forks one at a time, restoring each just before it
+# runs. With an arrival model, forks are fully independent.
+# Controller session parameters (SimulationCore.controller_params) are copied
+# into and out of the state; encoding them needs plain JSON values.
+#
+# Usage:
+#   sim.run(300)                                    # warm-up
+#   forks = fork_variants(sim, ["actuated", "max_pressure", "q_learning"])
+#   save_snapshot(sim, "warm.snap"); sim = load_snapshot("warm.snap")
+
+import copy
+import json
+import random
+import struct
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from models import Car, DIRECTIONS, LightState
+from arrivals import ArrivalSchedule, _Stream
+from trace_arrivals import TraceArrivals
+from lane_engine import VectorizedCarManager
+from metrics import WindowedMetrics
+from wait_stats import QuantileSketch, RunningStats, WaitTimeStats
+from simulation_core import SimulationCore
+
+
+MAGIC = b"TLSNAP\x00\x00"
+VERSION = 1
+_PREFIX = struct.Struct("<8sHI")
+_ALIGN = 8
+
+# Cars in lane order (models.DIRECTIONS), front to back within a lane
+CAR_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("lane", "i1"),
+    ("position", "<f8"),
+    ("speed", "<f8"),
+    ("committed", "?"),
+    ("color_idx", "i1"),
+    ("is_vip", "?"),
+    ("spawn_time", "<f8"),
+])
+
+DIRECTIONS_BY_NAME = {d.name: d for d in DIRECTIONS}
+
+# WindowedMetrics' open-window accumulators
+_WINDOW_FIELDS = ("_prev_time", "_prev_values", "_prev_phase", "_ticks", "_window_end", "_sums", "_maxes",
+                  "_ints", "_span", "_ns_time", "_switches", "_avg_wait")
+
+
+# --- Encoding -----------------------------------------------------------------
+def _split_arrays(obj: Any, arrays: List[np.ndarray]) -> Any:
+    """Copy of obj with every ndarray replaced by {"__array__": index}."""
+    if isinstance(obj, np.ndarray):
+        arrays.append(obj)
+        return {"__array__": len(arrays) - 1}
+    if isinstance(obj, dict):
+        return {key: _split_arrays(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_split_arrays(value, arrays) for value in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _join_arrays(obj: Any, arrays: List[np.ndarray]) -> Any:
+    if isinstance(obj, dict):
+        if "__array__" in obj:
+            return arrays[obj["__array__"]]
+        return {key: _join_arrays(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_join_arrays(value, arrays) for value in obj]
+    return obj
+
+
+def _check_controller_params(params: Dict) -> None:
+    """Session parameters must survive a JSON round trip unchanged (no
+    dataclasses, tuples or non-string keys), or a restore would differ."""
+    try:
+        same = json.loads(json.dumps(params)) == params
+    except (TypeError, ValueError):
+        same = False
+    if not same:
+        raise ValueError(f"controller_params {params!r} are not plain JSON values and cannot be saved in a snapshot")
+
+
+def encode(state: Dict) -> bytes:
+    _check_controller_params(state["core"].get("controller_params", {}))
+    arrays: List[np.ndarray] = []
+    tree = _split_arrays(state, arrays)
+
+    layout = []
+    offset = 0
+    for arr in arrays:
+        offset = -(-offset // _ALIGN) * _ALIGN
+        layout.append({
+            "dtype": np.lib.format.dtype_to_descr(arr.dtype),
+            "shape": list(arr.shape),
+            "offset": offset,
+        })
+        offset += arr.nbytes
+    header = json.dumps({"state": tree, "arrays": layout}).encode()
+
+    out = bytearray(_PREFIX.pack(MAGIC, VERSION, len(header)))
+    out += header
+    data_start = len(out)
+    out += bytes(offset)
+    for arr, entry in zip(arrays, layout):
+        start = data_start + entry["offset"]
+        out[start:start + arr.nbytes] = np.ascontiguousarray(arr).tobytes()
+    return bytes(out)
+
+
+def decode(data: bytes) -> Dict:
+    if len(data) < _PREFIX.size:
+        raise ValueError("not a simulation snapshot")
+    magic, version, header_len = _PREFIX.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a simulation snapshot")
+    if version != VERSION:
+        raise ValueError(f"unsupported snapshot version {version} (expected {VERSION})")
+    header_end = _PREFIX.size + header_len
+    header = json.loads(data[_PREFIX.size:header_end])
+
+    arrays = []
+    for entry in header["arrays"]:
+        dtype = np.lib.format.descr_to_dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        arr = np.frombuffer(data, dtype=dtype, count=count, offset=header_end + entry["offset"])
+        arrays.append(arr.reshape(entry["shape"]).copy())
+    return _join_arrays(header["state"], arrays)
+
+
+# --- Capturing ----------------------------------------------------------------
+def _running_state(stats: RunningStats) -> Dict:
+    return {"count": stats.count, "mean": stats.mean, "max": stats.max, "m2": stats._m2}
+
+
+def _sketch_state(sketch: QuantileSketch) -> Dict:
+    keys = sorted(sketch.buckets)
+    return {
+        "relative_accuracy": sketch.relative_accuracy,
+        "max_buckets": sketch.max_buckets,
+        "count": sketch.count,
+        "zero_count": sketch.zero_count,
+        "keys": np.array(keys, dtype=np.int64),
+        "counts": np.array([sketch.buckets[k] for k in keys], dtype=np.int64),
+    }
+
+
+def _car_state(cm) -> Dict:
+    if isinstance(cm, VectorizedCarManager):
+        parts = []
+        for lane_idx, lane in enumerate(cm.lanes.values()):
+            block = np.zeros(lane.n, dtype=CAR_DTYPE)
+            block["id"] = lane.car_id[:lane.n]
+            block["lane"] = lane_idx
+            for name in ("position", "speed", "committed", "color_idx", "is_vip", "spawn_time"):
+                block[name] = getattr(lane, name)[:lane.n]
+            parts.append(block)
+        cars = np.concatenate(parts)
+    else:
+        cars = np.array([(c.id, c.lane, c.position, c.speed, c.committed, c.color_idx, c.is_vip, c.spawn_time)
+                         for c in cm.iter_cars()], dtype=CAR_DTYPE)
+
+    ws = cm.wait_stats
+    return {
+        "cars": cars,
+        "next_id": cm.next_id,
+        "queue_counts": [cm.queue_counts[d] for d in DIRECTIONS],
+        "vip_queue_counts": [cm.vip_queue_counts[d] for d in DIRECTIONS],
+        "vip_count": cm.vip_count,
+        "wait_stats": {
+            "regular": _running_state(ws.regular),
+            "vip": _running_state(ws.vip),
+            "regular_sketch": _sketch_state(ws.regular_sketch),
+            "vip_sketch": _sketch_state(ws.vip_sketch),
+        },
+    }
+
+
+def _controller_state(tc) -> Dict:
+    log = tc.events
+    return {
+        "current_phase": tc.current_phase,
+        "phase_start_time": tc.phase_start_time,
+        "green_duration": tc.green_duration,
+        "yellow_duration": tc.yellow_duration,
+        "min_green_duration": tc.min_green_duration,
+        "ns_state": tc.ns_state.value,
+        "ew_state": tc.ew_state.value,
+        "simulated_time": tc.simulated_time,
+        "vips_waiting": dict(tc._vips_waiting),
+        "switch_reason": tc._switch_reason,
+        "events": dict(log.columns(), reasons=list(log.reasons)),
+    }
+
+
+def _arrival_state(arrivals) -> Optional[Dict]:
+    if arrivals is None:
+        return None
+    if isinstance(arrivals, TraceArrivals):
+        return {"kind": "trace", "path": arrivals.path, "seed": arrivals.seed,
+                "chunk_rows": arrivals.chunk_rows, "row": arrivals.rows_consumed}
+    rates = arrivals.direction_rates
+    return {
+        "kind": "schedule",
+        "model": arrivals.model,
+        "seed": arrivals.seed,
+        "direction_rates": None if rates is None else {d.name: rate for d, rate in rates.items()},
+        "jitter_s": arrivals.jitter_s,
+        "vip_prob": arrivals.vip_prob,
+        "horizon_ms": arrivals.horizon_ms,
+        "spawn_rate": arrivals.spawn_rate,
+        "rng": arrivals.rng.bit_generator.state,
+        "streams": [{"spawn_rate": s.spawn_rate, "lane": s.lane, "next_time": s.next_time}
+                    for s in arrivals.streams],
+        "times": arrivals.times[arrivals.cursor:],
+        "lanes": arrivals.lanes[arrivals.cursor:],
+        "is_vip": arrivals.is_vip[arrivals.cursor:],
+        "color_idx": arrivals.color_idx[arrivals.cursor:],
+        "drawn_until": arrivals.drawn_until,
+    }
+
+
+def _metrics_state(metrics) -> Dict:
+    if isinstance(metrics, WindowedMetrics):
+        return {
+            "kind": "windows",
+            "sample_interval_ms": metrics.interval_s * 1000.0,
+            "rows": metrics.rows.columns(),
+            "window": {name: getattr(metrics, name) for name in _WINDOW_FIELDS},
+        }
+    return {"kind": "ticks", "rows": metrics.columns()}
+
+
+def capture(core: SimulationCore) -> Dict:
+    """The complete state of `core` as nested dicts of scalars and arrays."""
+    version, internal, gauss_next = random.getstate()
+    return {
+        "core": {
+            "controller_name": core.controller_name,
+            "controller_params": copy.deepcopy(core.controller_params),
+            "spawn_rate": core.spawn_rate,
+            "engine": core.engine,
+            "integrator": core.integrator,
+            "lane_length": core.lane_length,
+            "record_metrics": core.record_metrics,
+            "current_time": core.current_time,
+            "last_spawn_time": core.last_spawn_time,
+        },
+        "random": {"version": version, "internal": np.array(internal, dtype=np.uint32),
+                   "gauss_next": gauss_next},
+        "cars": _car_state(core.car_manager),
+        "signal": _controller_state(core.traffic_controller),
+        "arrivals": _arrival_state(core.arrivals),
+        "metrics": _metrics_state(core.metrics),
+    }
+
+
+# --- Restoring ----------------------------------------------------------------
+def _restore_running(stats: RunningStats, state: Dict) -> None:
+    stats.count, stats.mean, stats.max, stats._m2 = state["count"], state["mean"], state["max"], state["m2"]
+
+
+def _restore_sketch(state: Dict) -> QuantileSketch:
+    sketch = QuantileSketch(state["relative_accuracy"], state["max_buckets"])
+    sketch.count = state["count"]
+    sketch.zero_count = state["zero_count"]
+    sketch.buckets = dict(zip(state["keys"].tolist(), state["counts"].tolist()))
+    return sketch
+
+
+def _restore_cars(cm, state: Dict) -> None:
+    cars = state["cars"]
+    if isinstance(cm, VectorizedCarManager):
+        for lane_idx, lane in enumerate(cm.lanes.values()):
+            block = cars[cars["lane"] == lane_idx]
+            n = len(block)
+            for name in lane._FIELDS:
+                arr = getattr(lane, name)
+                if len(arr) < n:
+                    arr = np.zeros(max(n, 2 * len(arr)), dtype=arr.dtype)
+                    setattr(lane, name, arr)
+                arr[:n] = block["id" if name == "car_id" else name]
+            lane.n = n
+    else:
+        for row in cars.tolist():
+            car_id, lane, position, speed, committed, color_idx, is_vip, spawn_time = row
+            cm.lanes[DIRECTIONS[lane]].append(
+                Car(car_id, lane, position, speed, committed, color_idx, is_vip, spawn_time))
+
+    cm.next_id = state["next_id"]
+    cm.queue_counts = dict(zip(DIRECTIONS, state["queue_counts"]))
+    cm.vip_queue_counts = dict(zip(DIRECTIONS, state["vip_queue_counts"]))
+    cm.vip_count = state["vip_count"]
+
+    ws_state = state["wait_stats"]
+    ws = WaitTimeStats()
+    _restore_running(ws.regular, ws_state["regular"])
+    _restore_running(ws.vip, ws_state["vip"])
+    ws.regular_sketch = _restore_sketch(ws_state["regular_sketch"])
+    ws.vip_sketch = _restore_sketch(ws_state["vip_sketch"])
+    cm.wait_stats = ws
+
+
+def _restore_controller(tc, state: Dict) -> None:
+    tc.current_phase = state["current_phase"]
+    tc.phase_start_time = state["phase_start_time"]
+    tc.green_duration = state["green_duration"]
+    tc.yellow_duration = state["yellow_duration"]
+    tc.min_green_duration = state["min_green_duration"]
+    tc.ns_state = LightState(state["ns_state"])
+    tc.ew_state = LightState(state["ew_state"])
+    tc.simulated_time = state["simulated_time"]
+    tc._vips_waiting = dict(state["vips_waiting"])
+    tc._switch_reason = state["switch_reason"]
+
+    events = state["events"]
+    log = tc.events
+    log.time = array("d", events["time"].tobytes())
+    log.kind = array("b", events["kind"].tobytes())
+    log.axis = array("b", events["axis"].tobytes())
+    log.reason = array("h", events["reason"].tobytes())
+    log.reasons = list(events["reasons"])
+    log._reason_code = {name: i for i, name in enumerate(log.reasons)}
+
+
+def _restore_arrivals(state: Optional[Dict]):
+    if state is None:
+        return None
+    if state["kind"] == "trace":
+        trace = TraceArrivals(state["path"], seed=state["seed"], chunk_rows=state["chunk_rows"])
+        trace.seek(state["row"])
+        return trace
+
+    rates = state["direction_rates"]
+    schedule = ArrivalSchedule(
+        state["spawn_rate"], state["model"], seed=state["seed"],
+        direction_rates=None if rates is None else {DIRECTIONS_BY_NAME[name]: r for name, r in rates.items()},
+        jitter_s=state["jitter_s"], vip_prob=state["vip_prob"], horizon_s=state["horizon_ms"] / 1000.0,
+    )
+    schedule.rng.bit_generator.state = state["rng"]
+    schedule.streams = []
+    for s in state["streams"]:
+        stream = _Stream(s["spawn_rate"], s["lane"])
+        stream.next_time = s["next_time"]
+        schedule.streams.append(stream)
+    # Copies: fork_variants restores several cores from one captured state
+    schedule.times = state["times"].copy()
+    schedule.lanes = state["lanes"].copy()
+    schedule.is_vip = state["is_vip"].copy()
+    schedule.color_idx = state["color_idx"].copy()
+    schedule.cursor = 0
+    schedule.drawn_until = state["drawn_until"]
+    return schedule
+
+
+def restore(state: Dict, controller_name: Optional[str] = None, restore_random: bool = True) -> SimulationCore:
+    """A new SimulationCore in `state` (from capture / decode).
+
+    controller_name swaps the decision controller; the signal keeps its
+    current phase and timers.
+    """
+    c = state["core"]
+    metrics = state["metrics"]
+    core = SimulationCore(
+        controller_name=controller_name or c["controller_name"], spawn_rate=c["spawn_rate"],
+        engine=c["engine"], record_metrics=c["record_metrics"], integrator=c["integrator"],
+        lane_length=c["lane_length"],
+        sample_interval_ms=metrics["sample_interval_ms"] if metrics["kind"] == "windows" else None,
+    )
+    if c.get("controller_params"):
+        core.controller_params = copy.deepcopy(c["controller_params"])
+        core.apply_controller(core.controller_name)
+    core.current_time = c["current_time"]
+    core.last_spawn_time = c["last_spawn_time"]
+    core.arrivals = _restore_arrivals(state["arrivals"])
+
+    _restore_cars(core.car_manager, state["cars"])
+    _restore_controller(core.traffic_controller, state["signal"])
+
+    if metrics["kind"] == "windows":
+        core.metrics.rows.load_columns(metrics["rows"])
+        for name, value in metrics["window"].items():
+            setattr(core.metrics, name, value)
+        core.metrics._prev_values = tuple(core.metrics._prev_values)
+    else:
+        core.metrics.load_columns(metrics["rows"])
+
+    if restore_random:
+        r = state["random"]
+        random.setstate((r["version"], tuple(r["internal"].tolist()), r["gauss_next"]))
+    return core
+
+
+# --- Public API -----------------------------------------------------------------
+def dumps(core: SimulationCore) -> bytes:
+    return encode(capture(core))
+
+
+def loads(data: bytes, controller_name: Optional[str] = None, restore_random: bool = True) -> SimulationCore:
+    return restore(decode(data), controller_name, restore_random)
+
+
+def save_snapshot(core: SimulationCore, path: str) -> None:
+    with open(path, "wb") as f:
+        f.write(dumps(core))
+
+
+def load_snapshot(path: str, controller_name: Optional[str] = None, restore_random: bool = True) -> SimulationCore:
+    with open(path, "rb") as f:
+        return loads(f.read(), controller_name, restore_random)
+
+
+def fork_variants(core: SimulationCore, controller_names: Iterable[str]) -> Dict[str, SimulationCore]:
+    """Independent copies of `core`'s current state, one per controller name."""
+    state = capture(core)
+    return {name: restore(state, name) for name in controller_names}
@@ -0,0 +1,111 @@
+# stress_test.py
+#
+# Headless saturation scenarios, far beyond the UI's 0.5-5 s spawn-rate
+# clamps: Poisson arrivals at tens of cars per second on long lanes, so
+# queues grow to thousands of cars. For each scenario it reports
+#   throughput    simulated seconds per wall-clock second
+#   peak memory   tracemalloc peak of a second, traced run of the same seed
+#   tick scaling  mean tick time per car-count bin, and a linear fit
+#
+# Usage:
+#   python3 stress_test.py
+#   python3 stress_test.py --rates 5 20 50 --lane-length 5000 --duration 300 --engine vectorized
+
+import argparse
+import time
+import tracemalloc
+from typing import Dict
+
+import numpy as np
+
+from car_manager import CarManager
+from lane_engine import ENGINES
+from simulation_core import SimulationCore
+
+
+DELTA_TIME = 16.67
+SEED = 0
+
+
+def make_sim(args, rate: float) -> SimulationCore:
+    return SimulationCore(controller_name=args.controller, spawn_rate=1.0 / rate, engine=args.engine,
+                          record_metrics=False, arrivals="poisson", seed=SEED, lane_length=args.lane_length)
+
+
+def timed_run(args, rate: float) -> Dict:
+    """Steps one scenario, timing every tick against the cars on the road."""
+    sim = make_sim(args, rate)
+    end_time = args.duration * 1000
+    car_counts, tick_ns = [], []
+    start = time.perf_counter()
+    while sim.current_time < end_time:
+        cars = sim.car_manager.get_car_count()
+        t0 = time.perf_counter_ns()
+        sim.update(DELTA_TIME)
+        tick_ns.append(time.perf_counter_ns() - t0)
+        car_counts.append(cars)
+    wall = time.perf_counter() - start
+    return {
+        "sim_per_wall": args.duration / wall,
+        "cars": np.array(car_counts),
+        "tick_us": np.array(tick_ns) / 1000.0,
+        "spawned": sim.car_manager.next_id,
+        "finished": sim.car_manager.next_id - sim.car_manager.get_car_count(),
+    }
+
+
+def peak_memory(args, rate: float) -> int:
+    """Peak bytes allocated during the scenario (traced separately: tracemalloc slows every allocation)."""
+    tracemalloc.start()
+    sim = make_sim(args, rate)
+    sim.run(args.duration)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def print_scaling(cars: np.ndarray, tick_us: np.ndarray, bins: int = 8) -> None:
+    edges = np.unique(np.linspace(0, cars.max() + 1, bins + 1).astype(int))
+    which = np.digitize(cars, edges[1:-1])
+    print(f"    {'cars':>13} {'ticks':>8} {'mean us':>10} {'p95 us':>10}")
+    for b in range(len(edges) - 1):
+        mask = which == b
+        if mask.any():
+            label = f"{edges[b]}-{edges[b + 1] - 1}"
+            print(f"    {label:>13} {int(mask.sum()):>8} {tick_us[mask].mean():>10.1f} "
+                  f"{np.percentile(tick_us[mask], 95):>10.1f}")
+    if len(np.unique(cars)) > 1:
+        slope, intercept = np.polyfit(cars, tick_us, 1)
+        print(f"    fit: {intercept:.1f} us + {slope:.3f} us/car")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless saturation stress test.")
+    parser.add_argument("--rates", type=float, nargs="+", default=[2, 10, 40],
+                        help="arrivals per second over all lanes (the UI allows 0.2-2)")
+    parser.add_argument("--lane-length", type=float, default=3000,
+                        help=f"spawn-to-exit distance (UI: {CarManager.DEFAULT_LANE_LENGTH})")
+    parser.add_argument("--duration", type=float, default=120, help="simulated seconds per scenario")
+    parser.add_argument("--engine", choices=list(ENGINES), default="vectorized")
+    parser.add_argument("--controller", default="max_pressure")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory run")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"STRESS TEST: engine={args.engine}, controller={args.controller}, "
+          f"lane_length={args.lane_length:g}, duration={args.duration:g}s")
+    print("=" * 60)
+    for rate in args.rates:
+        result = timed_run(args, rate)
+        print(f"\n{rate:g} arrivals/s: {result['spawned']} spawned, {result['finished']} finished, "
+              f"peak {result['cars'].max()} cars on the road")
+        print(f"  throughput: {result['sim_per_wall']:.2f} sim-s per wall-s")
+        if not args.no_memory:
+            print(f"  peak memory: {peak_memory(args, rate) / 1e6:.1f} MB")
+        print("  tick time by cars on the road:")
+        print_scaling(result["cars"], result["tick_us"])
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
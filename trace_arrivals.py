@@ -0,0 +1,192 @@
+# trace_arrivals.py
+#
+# Replays recorded detector arrivals instead of the synthetic spawn model.
+# Traces are read lazily, a chunk of rows at a time, so memory stays flat no
+# matter how long the trace is. Same interface as arrivals.ArrivalSchedule,
+# so SimulationCore consumes either one through the same cursor.
+#
+# Formats:
+#   CSV  header time_s,direction[,vip]; direction is north/south/east/west,
+#        N/S/E/W or the lane index 0-3; vip is 0/1 (missing: no VIPs).
+#        Rows must be in time order, times in seconds from the trace start.
+#   NPY  structured array with TRACE_DTYPE, memory-mapped (see convert_trace).
+#
+# Usage:
+#   python3 trace_arrivals.py convert detectors.csv detectors.npy
+
+import argparse
+import csv
+from itertools import islice
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from car_manager import CarManager
+from models import DIRECTION_INDEX
+
+
+TRACE_DTYPE = np.dtype([("time_ms", "<f8"), ("lane", "i1"), ("vip", "?")])
+
+CHUNK_ROWS = 65536
+
+# "north", "n" and "0" all name lane 0, and so on
+_LANE_NAMES = {key: i for d, i in DIRECTION_INDEX.items() for key in (d.value, d.value[0], str(i))}
+
+Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _parse_lane(name: str) -> int:
+    try:
+        return _LANE_NAMES[name.strip().lower()]
+    except KeyError:
+        raise ValueError(f"unknown direction {name!r} in trace") from None
+
+
+def read_csv_chunks(path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[Chunk]:
+    """(time_ms, lane, vip) arrays of up to chunk_rows rows each."""
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader)]
+        t_col = header.index("time_s")
+        d_col = header.index("direction")
+        v_col = header.index("vip") if "vip" in header else None
+
+        while True:
+            rows = list(islice(reader, chunk_rows))
+            if not rows:
+                return
+            times = np.array([float(r[t_col]) for r in rows]) * 1000
+            lanes = np.array([_parse_lane(r[d_col]) for r in rows], dtype=np.int8)
+            if v_col is None:
+                vips = np.zeros(len(rows), dtype=bool)
+            else:
+                vips = np.array([r[v_col].strip() not in ("", "0", "false", "False") for r in rows])
+            yield times, lanes, vips
+
+
+def read_npy_chunks(path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[Chunk]:
+    """Same chunks from a memory-mapped TRACE_DTYPE .npy file."""
+    trace = np.load(path, mmap_mode="r")
+    if trace.dtype != TRACE_DTYPE:
+        raise ValueError(f"{path}: expected dtype {TRACE_DTYPE}, got {trace.dtype}")
+    for start in range(0, len(trace), chunk_rows):
+        # Copy out of the map so the pages can be dropped again
+        block = np.array(trace[start:start + chunk_rows])
+        yield block["time_ms"], block["lane"], block["vip"]
+
+
+def read_trace_chunks(path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[Chunk]:
+    if path.endswith(".npy"):
+        return read_npy_chunks(path, chunk_rows)
+    return read_csv_chunks(path, chunk_rows)
+
+
+class TraceArrivals:
+    """Arrival cursor over a trace file, one chunk in memory at a time.
+
+    Detector traces carry no car colors, so those come from `seed`.
+    """
+
+    def __init__(self, path: str, seed: Optional[int] = None, chunk_rows: int = CHUNK_ROWS):
+        self.path = path
+        self.seed = seed
+        self.chunk_rows = chunk_rows
+        self.reset()
+
+    def reset(self) -> None:
+        """Rewinds to the start of the trace."""
+        self.rng = np.random.default_rng(self.seed)
+        self._chunks = read_trace_chunks(self.path, self.chunk_rows)
+        self.chunk_start = 0    # trace row of self.times[0]
+        self._set_chunk(np.zeros(0), np.zeros(0, dtype=np.int8), np.zeros(0, dtype=bool))
+        self.exhausted = False
+
+    def set_spawn_rate(self, spawn_rate: float, now: float) -> None:
+        """The trace fixes the arrivals; spawn_rate changes are ignored."""
+
+    def _set_chunk(self, times, lanes, vips) -> None:
+        self.times = times
+        self.lanes = lanes
+        self.is_vip = vips
+        self.color_idx = np.where(
+            vips,
+            self.rng.integers(CarManager.VIP_COLOR_IDX.start, CarManager.VIP_COLOR_IDX.stop, len(vips)),
+            self.rng.integers(CarManager.CAR_COLOR_IDX.start, CarManager.CAR_COLOR_IDX.stop, len(vips)),
+        ).astype(np.int8)
+        self.cursor = 0
+
+    def _next_chunk(self) -> bool:
+        if not self.exhausted:
+            for chunk in self._chunks:
+                if len(chunk[0]):
+                    self.chunk_start += len(self.times)
+                    self._set_chunk(*chunk)
+                    return True
+            self.exhausted = True
+        return False
+
+    @property
+    def rows_consumed(self) -> int:
+        return self.chunk_start + self.cursor
+
+    def seek(self, row: int) -> None:
+        """Restarts and skips the first `row` arrivals, drawing the same colors
+        as consuming them would (used to restore snapshots)."""
+        self.reset()
+        while row > self.chunk_start + len(self.times) and self._next_chunk():
+            pass
+        self.cursor = min(row - self.chunk_start, len(self.times))
+
+    def next_time(self) -> float:
+        """Time (ms) of the next arrival not yet consumed; inf at the end of the trace."""
+        if self.cursor == len(self.times) and not self._next_chunk():
+            return float("inf")
+        return float(self.times[self.cursor])
+
+    def pop_due(self, current_time: float) -> Chunk:
+        """(lanes, is_vip, color_idx) of every arrival at or before current_time."""
+        parts = []
+        # next_time() is inf once the trace is exhausted, with nothing left to take
+        while self.next_time() <= current_time and self.cursor < len(self.times):
+            start = self.cursor
+            self.cursor = int(np.searchsorted(self.times, current_time, side="right"))
+            parts.append((self.lanes[start:self.cursor], self.is_vip[start:self.cursor],
+                          self.color_idx[start:self.cursor]))
+
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return self.lanes[:0], self.is_vip[:0], self.color_idx[:0]
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def convert_trace(csv_path: str, npy_path: str, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Streams a CSV trace into a TRACE_DTYPE .npy file; returns the row count."""
+    rows = sum(len(times) for times, _, _ in read_csv_chunks(csv_path, chunk_rows))
+    out = np.lib.format.open_memmap(npy_path, mode="w+", dtype=TRACE_DTYPE, shape=(rows,))
+    pos = 0
+    for times, lanes, vips in read_csv_chunks(csv_path, chunk_rows):
+        end = pos + len(times)
+        out["time_ms"][pos:end] = times
+        out["lane"][pos:end] = lanes
+        out["vip"][pos:end] = vips
+        pos = end
+    out.flush()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detector trace tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="convert a CSV trace to a memory-mappable .npy file")
+    convert.add_argument("csv_path")
+    convert.add_argument("npy_path")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        rows = convert_trace(args.csv_path, args.npy_path)
+        print(f"{rows} arrivals written to {args.npy_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,16 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Tuple
+
+import numpy as np
 
 from models import Direction, LightState
+from phase_log import PhaseEventLog, GREEN, YELLOW, RED, PREEMPT, VIP_REQUEST
+
+
+# Decisions remembered per controller; the oldest is dropped when full
+DECISION_CACHE_SIZE = 4096
 
 
 class TrafficController:
@@ -31,13 +38,38 @@ class TrafficController:
         # Optional external controller (must implement act(...) -> 0/1)
         self.decision_controller: Optional[Any] = None
 
+        # Decisions of a deterministic controller, keyed by the act() arguments:
+        # they only change when a queue does or a whole second passes, so most
+        # ticks reuse one. Cleared on set_controller and whenever the policy
+        # object behind a session changes (a policy_store.py session moving to
+        # another version, or its file reloaded under the same version).
+        self._decisions: Dict[Tuple, Tuple[int, str]] = {}
+        self._memoize = False
+        self._tracks_policy = False
+        self._decision_policy = None
+        self.decision_calls = 0     # act() calls made
+        self.decision_hits = 0      # decisions taken from the cache instead
+
         # Simulated time tracker
         self.simulated_time = 0.0
 
+        # Every light transition, VIP request and preemption (see phase_log.py)
+        self.events = PhaseEventLog()
+        self.events.emit(0.0, GREEN, "NS", "initial")
+        self._vips_waiting = {"NS": False, "EW": False}
+        self._switch_reason = ""
+        # (tick times, first tick of each green second, its decision) that
+        # quiet_ticks looked ahead over; skip_to counts the ticks skipped
+        self._skipped_decisions: Optional[Tuple] = None
+
     # --- Public API ---------------------------------------------------------
     def set_controller(self, controller: Optional[Any]) -> None:
         """Attach a controller (or None to disable)."""
         self.decision_controller = controller
+        self._decisions.clear()
+        self._memoize = bool(getattr(controller, "deterministic", False))
+        self._tracks_policy = hasattr(controller, "policy")
+        self._decision_policy = getattr(controller, "policy", None)
 
         # If the controller has reset, call it (safe)
         if controller is not None and hasattr(controller, "reset"):
@@ -50,6 +82,15 @@ class TrafficController:
     def set_q_controller(self, q_controller: Optional[Any]) -> None:
         self.set_controller(q_controller)
 
+    def decision_stats(self) -> Dict[str, float]:
+        """Controller decisions made vs. reused from the cache."""
+        total = self.decision_calls + self.decision_hits
+        return {
+            "calls": self.decision_calls,
+            "hits": self.decision_hits,
+            "hit_rate": self.decision_hits / total if total else 0.0,
+        }
+
     def get_light_state(self, direction: Direction) -> LightState:
         if direction in (Direction.NORTH, Direction.SOUTH):
             return self.ns_state
@@ -69,6 +110,7 @@ class TrafficController:
         # VIP totals per axis
         ns_vips = vip_queue_stats[Direction.NORTH] + vip_queue_stats[Direction.SOUTH]
         ew_vips = vip_queue_stats[Direction.EAST] + vip_queue_stats[Direction.WEST]
+        self._log_vip_requests(ns_vips, ew_vips)
 
         # If any VIPs are waiting, give them priority immediately
         if ns_vips > 0 or ew_vips > 0:
@@ -83,6 +125,7 @@ class TrafficController:
                 if elapsed >= self.green_duration or should_switch:
                     self.ns_state = LightState.YELLOW
                     self.phase_start_time = self.simulated_time
+                    self._log_yellow("NS", elapsed)
 
             elif self.ns_state == LightState.YELLOW:
                 if elapsed >= self.yellow_duration:
@@ -90,6 +133,8 @@ class TrafficController:
                     self.ew_state = LightState.GREEN
                     self.current_phase = "EW"
                     self.phase_start_time = self.simulated_time
+                    self.events.emit(self.simulated_time, RED, "NS")
+                    self.events.emit(self.simulated_time, GREEN, "EW")
 
         else:  # EW phase
             if self.ew_state == LightState.GREEN:
@@ -97,6 +142,7 @@ class TrafficController:
                 if elapsed >= self.green_duration or should_switch:
                     self.ew_state = LightState.YELLOW
                     self.phase_start_time = self.simulated_time
+                    self._log_yellow("EW", elapsed)
 
             elif self.ew_state == LightState.YELLOW:
                 if elapsed >= self.yellow_duration:
@@ -104,45 +150,86 @@ class TrafficController:
                     self.ns_state = LightState.GREEN
                     self.current_phase = "NS"
                     self.phase_start_time = self.simulated_time
+                    self.events.emit(self.simulated_time, RED, "EW")
+                    self.events.emit(self.simulated_time, GREEN, "NS")
 
     # --- Internal decision logic -------------------------------------------
     def _should_switch_phase(self, queue_stats: Dict[Direction, int], elapsed_ms: float) -> bool:
-        """Ask the controller (or fallback heuristic) whether to switch early."""
-
+        """Ask the controller (or fallback heuristic) whether to switch early.
+        Counts the controller's decisions and caches a deterministic one's."""
+        key = self._decision_key(queue_stats, elapsed_ms)
+        if key is not None and self._memoize:
+            cached = self._cached_decision(key)
+            if cached is not None:
+                self.decision_hits += 1
+                self._switch_reason = cached[1]
+                return cached[0]
+        if key is not None:
+            self.decision_calls += 1
+        should_switch, self._switch_reason, answered = self._decide(queue_stats, elapsed_ms)
+        if answered and self._memoize:
+            self._remember(key, should_switch, self._switch_reason)
+        return should_switch
+
+    def _decide(self, queue_stats: Dict[Direction, int], elapsed_ms: float) -> Tuple[bool, str, bool]:
+        """(switch early?, reason, whether the controller answered) without
+        counting or caching anything, so quiet_ticks can look ahead with it."""
         # Enforce minimum green (prevents flicker)
         if elapsed_ms < self.min_green_duration:
-            return False
+            return False, "", False
 
         ns_count = queue_stats[Direction.NORTH] + queue_stats[Direction.SOUTH]
         ew_count = queue_stats[Direction.EAST] + queue_stats[Direction.WEST]
 
         # If nobody is waiting anywhere, never switch early
         if (ns_count + ew_count) == 0:
-            return False
+            return False, "", False
 
         # External controller decision
         if self.decision_controller is not None:
-            green_elapsed_s = int(elapsed_ms / 1000.0)
-            phase_val = 0 if self.current_phase == "NS" else 1
             try:
-                action = self.decision_controller.act(
-                    queue_stats[Direction.NORTH],
-                    queue_stats[Direction.SOUTH],
-                    queue_stats[Direction.EAST],
-                    queue_stats[Direction.WEST],
-                    phase_val,
-                    green_elapsed_s,
-                )
-                return bool(action == 1)
+                action = self.decision_controller.act(*self._decision_key(queue_stats, elapsed_ms))
             except Exception:
                 # If controller fails, fall back to simple imbalance heuristic
                 pass
+            else:
+                # Controllers may say why they asked to switch
+                reason = getattr(self.decision_controller, "last_reason", "") or "controller"
+                return bool(action == 1), reason, True
 
         # Fallback: switch if other axis has 2x more cars and current axis isn't empty
         if self.current_phase == "NS":
-            return ew_count > max(3, 2 * ns_count)
+            return ew_count > max(3, 2 * ns_count), "fallback_imbalance", False
         else:
-            return ns_count > max(3, 2 * ew_count)
+            return ns_count > max(3, 2 * ew_count), "fallback_imbalance", False
+
+    def _decision_key(self, queue_stats: Dict[Direction, int], elapsed_ms: float) -> Optional[Tuple]:
+        """The act() arguments, or None when the controller isn't asked (no
+        controller, min green not reached or nobody waiting)."""
+        if (self.decision_controller is None or elapsed_ms < self.min_green_duration
+                or sum(queue_stats.values()) == 0):
+            return None
+        return (
+            queue_stats[Direction.NORTH],
+            queue_stats[Direction.SOUTH],
+            queue_stats[Direction.EAST],
+            queue_stats[Direction.WEST],
+            0 if self.current_phase == "NS" else 1,
+            int(elapsed_ms / 1000.0),
+        )
+
+    def _cached_decision(self, key: Tuple) -> Optional[Tuple[bool, str]]:
+        if self._tracks_policy:
+            policy = self.decision_controller.policy
+            if policy is not self._decision_policy:
+                self._decisions.clear()
+                self._decision_policy = policy
+        return self._decisions.get(key)
+
+    def _remember(self, key: Tuple, should_switch: bool, reason: str) -> None:
+        if len(self._decisions) >= DECISION_CACHE_SIZE:
+            del self._decisions[next(iter(self._decisions))]
+        self._decisions[key] = (should_switch, reason)
 
     def _handle_vip_preemption(self, ns_vips: int, ew_vips: int) -> None:
         """VIP logic: whichever axis has VIP cars waiting gets immediate green."""
@@ -156,6 +243,14 @@ class TrafficController:
         self._set_phase_immediately(desired_phase)
 
     def _set_phase_immediately(self, phase: str) -> None:
+        target_state, other_state = (self.ns_state, self.ew_state) if phase == "NS" else (self.ew_state, self.ns_state)
+        if target_state != LightState.GREEN:
+            other = "EW" if phase == "NS" else "NS"
+            self.events.emit(self.simulated_time, PREEMPT, phase, "vip")
+            if other_state != LightState.RED:
+                self.events.emit(self.simulated_time, RED, other, "vip")
+            self.events.emit(self.simulated_time, GREEN, phase, "vip")
+
         if phase == "NS":
             self.current_phase = "NS"
             self.ns_state = LightState.GREEN
@@ -167,6 +262,98 @@ class TrafficController:
 
         self.phase_start_time = self.simulated_time
 
+    # --- Event log ------------------------------------------------------------
+    def _log_vip_requests(self, ns_vips: int, ew_vips: int) -> None:
+        for axis, count in (("NS", ns_vips), ("EW", ew_vips)):
+            waiting = count > 0
+            if waiting and not self._vips_waiting[axis]:
+                self.events.emit(self.simulated_time, VIP_REQUEST, axis)
+            self._vips_waiting[axis] = waiting
+
+    def _log_yellow(self, axis: str, elapsed: float) -> None:
+        reason = "green_timeout" if elapsed >= self.green_duration else self._switch_reason
+        self.events.emit(self.simulated_time, YELLOW, axis, reason)
+
+    def quiet_ticks(self, queue_stats: Dict[Direction, int], vip_queue_stats: Dict[Direction, int],
+                    times: np.ndarray) -> int:
+        """How many of the updates at simulated `times` (one per tick, with
+        these queues throughout) would leave the lights and the event log as
+        they are. Fast-forward skips those ticks with skip_to().
+
+        Only the green/yellow timeout, min-green expiry and the controller
+        can change the lights. A deterministic controller (or the fallback
+        heuristic) only changes its mind when its inputs do, so it is asked
+        once per whole second of green_elapsed_s; any other controller is
+        asked every tick, so the span stops where it would be.
+        """
+        self._skipped_decisions = None
+        ns_vips = vip_queue_stats[Direction.NORTH] + vip_queue_stats[Direction.SOUTH]
+        ew_vips = vip_queue_stats[Direction.EAST] + vip_queue_stats[Direction.WEST]
+        if (ns_vips > 0) != self._vips_waiting["NS"] or (ew_vips > 0) != self._vips_waiting["EW"]:
+            return 0    # update() logs the VIP request first
+        if ns_vips > 0 or ew_vips > 0:
+            # Preemption only restarts the phase clock once the VIP's axis is green
+            desired_phase = "NS" if ew_vips == 0 else "EW" if ns_vips == 0 else self.current_phase
+            state = self.ns_state if desired_phase == "NS" else self.ew_state
+            return len(times) if state == LightState.GREEN else 0
+
+        elapsed = times - self.phase_start_time
+        current_state = self.ns_state if self.current_phase == "NS" else self.ew_state
+        duration = self.green_duration if current_state == LightState.GREEN else self.yellow_duration
+        timeout = elapsed >= duration
+        quiet = int(np.argmax(timeout)) if timeout.any() else len(times)
+        if current_state != LightState.GREEN or sum(queue_stats.values()) == 0:
+            return quiet
+
+        eligible = elapsed[:quiet] >= self.min_green_duration
+        if not eligible.any():
+            return quiet
+        first = int(np.argmax(eligible))
+        if self.decision_controller is not None and not self._memoize:
+            return first
+        seconds = (elapsed[first:quiet] / 1000.0).astype(np.int64)
+        starts = first + np.flatnonzero(np.diff(seconds, prepend=-1))
+        decisions = []
+        for k in starts.tolist():
+            should_switch, reason, answered = self._decide(queue_stats, float(elapsed[k]))
+            if should_switch:
+                quiet = k
+                break
+            decisions.append((self._decision_key(queue_stats, float(elapsed[k])), reason, answered))
+        if self.decision_controller is not None and quiet > first:
+            self._skipped_decisions = (times[first:quiet], starts[:len(decisions)] - first, decisions)
+        return quiet
+
+    def skip_to(self, simulated_time: float) -> None:
+        """Moves the clock past ticks quiet_ticks() allowed. A waiting VIP's
+        preemption restarts the phase clock on each of them."""
+        if self._skipped_decisions is not None:
+            self._count_skipped_decisions(simulated_time)
+        self.simulated_time = simulated_time
+        if self._vips_waiting["NS"] or self._vips_waiting["EW"]:
+            self.phase_start_time = simulated_time
+
+    def _count_skipped_decisions(self, simulated_time: float) -> None:
+        """Counts and caches the controller decisions update() would have
+        made on the skipped ticks: one act() per new whole second of green
+        and cache hits for the rest (every tick asks when act() fails)."""
+        times, starts, decisions = self._skipped_decisions
+        self._skipped_decisions = None
+        ticks = int(np.count_nonzero(times <= simulated_time))
+        sizes = np.diff(np.append(starts, len(times))).tolist()
+        for start, size, (key, reason, answered) in zip(starts.tolist(), sizes, decisions):
+            if start >= ticks:
+                break
+            size = min(size, ticks - start)
+            if self._cached_decision(key) is not None:
+                self.decision_hits += size
+            elif not answered:
+                self.decision_calls += size
+            else:
+                self.decision_calls += 1
+                self.decision_hits += size - 1
+                self._remember(key, False, reason)
+
     def get_phase_time_remaining(self) -> float:
         """
         Devuelve el tiempo restante (ms) de la fase actual (GREEN/YELLOW).
@@ -183,4 +370,3 @@ class TrafficController:
             return max(0.0, float(self.yellow_duration) - elapsed)
 
         return 0.0
-
@@ -8,11 +8,18 @@
 # - total reward
 # - average total queue
 # - number of phase switches
+#
+# Usage:
+#   python3 train_q_learning_advanced.py [--binary]
+# --binary also writes q_table_advanced.qtab, the memory-mapped format
+# QTableController prefers (see q_policy.py).
 
+import argparse
 import json
 import random
 from collections import defaultdict
 from q_learning_env_advanced import TrafficEnvAdvanced
+from q_policy import DEFAULT_BINARY, q_values_from_table, save_binary
 
 # Q-table structure:
 # Q[state] = [value_if_keep_phase, value_if_switch_phase]
@@ -45,7 +52,7 @@ def choose_action(state):
     return 0 if keep >= switch else 1
 
 
-def train():
+def train(binary: bool = False):
     """
     Main training loop.
     The agent interacts with the environment, updates the Q-table,
@@ -115,6 +122,10 @@ def train():
 
     print("Training finished. Q-table saved to q_table_advanced.json")
 
+    if binary:
+        save_binary(DEFAULT_BINARY, q_values_from_table(Q), source="train_q_learning_advanced.py")
+        print(f"Binary Q-table saved to {DEFAULT_BINARY}")
+
     # Save training metrics for later analysis
     metrics = {
         "episode_rewards": episode_rewards,
@@ -135,4 +146,7 @@ def train():
 
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the Q-learning traffic controller.")
+    parser.add_argument("--binary", action="store_true",
+                        help=f"also write {DEFAULT_BINARY} (memory-mapped format, see q_policy.py)")
+    train(parser.parse_args().binary)
@@ -0,0 +1,157 @@
+# trajectory.py
+#
+# Opt-in per-car trajectory recording for debugging car-following.
+# Every sampled tick writes one fixed-size binary record per car on the road
+# (id, lane, time, position, speed, committed), buffered in a preallocated
+# chunk and appended to the file a chunk at a time. With decimation=k only
+# every k-th tick is sampled.
+#
+# A CarManager only records while its `recorder` is set; the disabled cost is
+# one `is None` check per update_cars call.
+#
+# File layout:
+#   b"TRAJ" | uint32 header length | JSON header | records (RECORD_DTYPE)
+#
+# Usage:
+#   sim = SimulationCore(trajectory="run.traj", trajectory_decimation=6)
+#   sim.run(60)
+#   sim.close()
+#   cars = read_trajectories("run.traj")    # {car id: records of that car}
+
+import json
+import struct
+from typing import Dict, Iterable
+
+import numpy as np
+
+from models import Car
+
+
+MAGIC = b"TRAJ"
+VERSION = 1
+
+RECORD_DTYPE = np.dtype([
+    ("car_id", "<u4"),
+    ("lane", "i1"),         # index into models.DIRECTIONS
+    ("time", "<f8"),        # simulation time, ms
+    ("position", "<f4"),
+    ("speed", "<f4"),
+    ("committed", "?"),
+])
+
+CHUNK_RECORDS = 16384
+
+
+class TrajectoryRecorder:
+    """Buffered writer of RECORD_DTYPE records, one per car per sampled tick."""
+
+    def __init__(self, path: str, decimation: int = 1, chunk_records: int = CHUNK_RECORDS):
+        if decimation < 1:
+            raise ValueError(f"decimation must be >= 1, got {decimation}")
+        self.path = path
+        self.decimation = decimation
+        self._buffer = np.zeros(chunk_records, dtype=RECORD_DTYPE)
+        self._n = 0
+        self._tick = 0
+        self.records_written = 0
+
+        header = json.dumps({
+            "version": VERSION,
+            "dtype": RECORD_DTYPE.descr,
+            "decimation": decimation,
+        }).encode()
+        self._file = open(path, "wb")
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def sample(self) -> bool:
+        """Called once per tick; True on the ticks that are recorded."""
+        due = self._tick % self.decimation == 0
+        self._tick += 1
+        return due
+
+    def skip(self, ticks: int) -> None:
+        """Advances the decimation count over ticks that were not stepped (fast-forward)."""
+        self._tick += ticks
+
+    def _reserve(self, count: int) -> np.ndarray:
+        """Buffer slice for `count` more records, flushing first if they do not fit."""
+        if self._n + count > len(self._buffer):
+            self.flush()
+            if count > len(self._buffer):
+                self._buffer = np.zeros(count, dtype=RECORD_DTYPE)
+        block = self._buffer[self._n:self._n + count]
+        self._n += count
+        return block
+
+    def write(self, time: float, car_id, lane, position, speed, committed) -> None:
+        """Records one tick of a group of cars given as arrays (lane may be a scalar)."""
+        block = self._reserve(len(car_id))
+        block["car_id"] = car_id
+        block["lane"] = lane
+        block["time"] = time
+        block["position"] = position
+        block["speed"] = speed
+        block["committed"] = committed
+
+    def write_cars(self, time: float, cars: Iterable[Car]) -> None:
+        """Records one tick of Car objects."""
+        rows = [(car.id, car.lane, time, car.position, car.speed, car.committed) for car in cars]
+        if rows:
+            block = self._reserve(len(rows))
+            block[:] = rows
+
+    def flush(self) -> None:
+        if self._n:
+            self._file.write(self._buffer[:self._n].tobytes())
+            self.records_written += self._n
+            self._n = 0
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+# --- Reading --------------------------------------------------------------------
+def read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        return _read_header(f)[0]
+
+
+def _read_header(f):
+    if f.read(4) != MAGIC:
+        raise ValueError(f"{f.name}: not a trajectory file")
+    (size,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(size))
+    if header["version"] != VERSION:
+        raise ValueError(f"{f.name}: unsupported trajectory version {header['version']}")
+    return header, 8 + size
+
+
+def load_records(path: str) -> np.ndarray:
+    """Every record in the file, memory-mapped, in write order.
+
+    A partly written last record (interrupted run) is ignored.
+    """
+    with open(path, "rb") as f:
+        header, offset = _read_header(f)
+        f.seek(0, 2)
+        count = (f.tell() - offset) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=offset, shape=(count,))
+
+
+def read_trajectories(path: str) -> Dict[int, np.ndarray]:
+    """{car id: that car's records in time order}.
+
+    Each value is a RECORD_DTYPE array, so traj[i]["position"] etc. are plain
+    NumPy columns.
+    """
+    records = load_records(path)
+    # Records are written tick by tick, so a stable sort keeps each car's in time order
+    order = np.argsort(records["car_id"], kind="stable")
+    records = records[order]
+    ids, starts = np.unique(records["car_id"], return_index=True)
+    return {int(car_id): block for car_id, block in zip(ids.tolist(), np.split(records, starts[1:]))}
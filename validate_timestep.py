@@ -0,0 +1,122 @@
+# validate_timestep.py
+#
+# Checks that car dynamics give the same aggregate results at large
+# simulation steps as at the 16.67 ms reference step.
+#
+# For every seed, the reference run records its arrivals and each coarse run
+# replays exactly those arrivals, so any difference comes from the step size
+# and not from the per-tick spawn check.
+#
+# Usage:
+#   python3 validate_timestep.py                       # continuous integrator
+#   python3 validate_timestep.py --integrator tick     # shows why "tick" needs 16 ms
+
+import argparse
+import random
+import sys
+
+import numpy as np
+
+from simulation_core import SimulationCore
+
+
+REFERENCE_STEP = 16.67
+STEPS_MS = [100, 250, 500]
+
+
+class RecordingCore(SimulationCore):
+    """Reference run that remembers every arrival it spawns."""
+
+    def reset(self) -> None:
+        super().reset()
+        self.recorded = []
+
+    def spawn(self, direction, force_vip: bool = False, color_idx=None) -> None:
+        super().spawn(direction, force_vip, color_idx)
+        car = self.car_manager.lanes[direction][-1]
+        self.recorded.append((self.current_time, direction, car.is_vip))
+
+
+class ReplayCore(SimulationCore):
+    """Spawns a recorded list of arrivals instead of drawing new ones."""
+
+    def __init__(self, recorded, **kwargs):
+        self.recorded = recorded
+        super().__init__(**kwargs)
+
+    def reset(self) -> None:
+        super().reset()
+        self.car_manager.VIP_SPAWN_PROB = 0.0  # VIPs come from the recording only
+        self._cursor = 0
+
+    def _spawn_cars(self) -> None:
+        while self._cursor < len(self.recorded) and self.recorded[self._cursor][0] <= self.current_time:
+            _, direction, is_vip = self.recorded[self._cursor]
+            self.spawn(direction, force_vip=is_vip)
+            self._cursor += 1
+
+
+def summarize(sim: SimulationCore) -> dict:
+    queue = sim.metrics["total_queue"]
+    switches = int(np.count_nonzero(np.diff(sim.metrics["phase"])))
+    return {
+        "avg_queue": queue.mean() if len(queue) else 0.0,
+        "avg_wait": sim.car_manager.get_avg_wait_time() / 1000.0,
+        "completed": sim.car_manager.wait_stats.stats().count,
+        "switches": switches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare aggregate metrics across simulation step sizes.")
+    parser.add_argument("--integrator", default="continuous", choices=["tick", "continuous"])
+    parser.add_argument("--controller", default="actuated")
+    parser.add_argument("--spawn-rate", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=120.0, help="simulated seconds per run")
+    parser.add_argument("--seeds", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="max relative difference of avg queue / avg wait vs reference")
+    args = parser.parse_args()
+
+    options = dict(controller_name=args.controller, spawn_rate=args.spawn_rate, integrator=args.integrator)
+
+    results = {step: [] for step in [REFERENCE_STEP] + STEPS_MS}
+    for seed in range(args.seeds):
+        random.seed(seed)
+        reference = RecordingCore(**options)
+        reference.run(args.duration, delta_time=REFERENCE_STEP)
+        results[REFERENCE_STEP].append(summarize(reference))
+
+        for step in STEPS_MS:
+            replay = ReplayCore(reference.recorded, **options)
+            replay.run(args.duration, delta_time=step)
+            results[step].append(summarize(replay))
+
+    def mean(step, key):
+        return float(np.mean([r[key] for r in results[step]]))
+
+    print("=" * 70)
+    print(f"TIMESTEP VALIDATION ({args.integrator} integrator, {args.controller}, "
+          f"spawn_rate={args.spawn_rate}s, {args.seeds} seeds)")
+    print("=" * 70)
+    print(f"{'step_ms':>8} {'avg_queue':>10} {'diff':>7} {'avg_wait_s':>11} {'diff':>7} {'completed':>10} {'switches':>9}")
+
+    failed = False
+    for step in results:
+        row = {key: mean(step, key) for key in ["avg_queue", "avg_wait", "completed", "switches"]}
+        diffs = []
+        for key in ["avg_queue", "avg_wait"]:
+            ref = mean(REFERENCE_STEP, key)
+            diffs.append(abs(row[key] - ref) / ref if ref else 0.0)
+        if step != REFERENCE_STEP and max(diffs) > args.tolerance:
+            failed = True
+        print(f"{step:>8} {row['avg_queue']:>10.2f} {diffs[0]:>7.1%} {row['avg_wait']:>11.2f} "
+              f"{diffs[1]:>7.1%} {row['completed']:>10.1f} {row['switches']:>9.1f}")
+
+    print("=" * 70)
+    print("FAIL" if failed else "OK", f"(tolerance {args.tolerance:.0%})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
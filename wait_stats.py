@@ -0,0 +1,166 @@
+# wait_stats.py
+#
+# Constant-memory statistics for the wait time of finished cars.
+# CarManager feeds every finished car in here instead of keeping a list,
+# so mean / variance / max are O(1) and percentiles come from a small sketch.
+
+import math
+from typing import Dict, Optional
+
+
+class RunningStats:
+    """Count, mean, variance and max using Welford's online update."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.max = 0.0
+        self._m2 = 0.0  # sum of squared deviations from the mean
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if self.count == 1 or x > self.max:
+            self.max = x
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """Returns the statistics of both samples combined (Chan et al.)."""
+        out = RunningStats()
+        out.count = self.count + other.count
+        if out.count == 0:
+            return out
+        delta = other.mean - self.mean
+        out.mean = self.mean + delta * other.count / out.count
+        out._m2 = self._m2 + other._m2 + delta * delta * self.count * other.count / out.count
+        if self.count == 0:
+            out.max = other.max
+        elif other.count == 0:
+            out.max = self.max
+        else:
+            out.max = max(self.max, other.max)
+        return out
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0 with fewer than two values)."""
+        if self.count < 2:
+            return 0.0
+        return self._m2 / (self.count - 1)
+
+
+class QuantileSketch:
+    """Log-bucketed histogram for approximate quantiles (DDSketch-style).
+
+    Every value is counted in bucket ceil(log_gamma(x)), so any quantile is
+    returned within `relative_accuracy` of a true sample value. Memory is
+    bounded by `max_buckets`: when exceeded, the two lowest buckets merge,
+    which only affects accuracy of the smallest values.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 1024):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0  # values <= 0 (a car that finished instantly)
+        self.count = 0
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        if x <= 0:
+            self.zero_count += 1
+            return
+
+        key = math.ceil(math.log(x) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        out = QuantileSketch(self.relative_accuracy, self.max_buckets)
+        out.count = self.count + other.count
+        out.zero_count = self.zero_count + other.zero_count
+        out.buckets = dict(self.buckets)
+        for key, n in other.buckets.items():
+            out.buckets[key] = out.buckets.get(key, 0) + n
+        while len(out.buckets) > out.max_buckets:
+            out._collapse()
+        return out
+
+    def quantile(self, q: float) -> float:
+        """Approximate q-quantile (0 <= q <= 1); 0.0 when empty."""
+        if self.count == 0:
+            return 0.0
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # Midpoint of the bucket (gamma^(k-1), gamma^k] in relative terms
+                return 2.0 * self.gamma ** key / (self.gamma + 1)
+
+        return 2.0 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class WaitTimeStats:
+    """Wait-time statistics split into regular and VIP cars."""
+
+    PERCENTILES = (0.50, 0.95, 0.99)
+
+    def __init__(self):
+        self.regular = RunningStats()
+        self.vip = RunningStats()
+        self.regular_sketch = QuantileSketch()
+        self.vip_sketch = QuantileSketch()
+
+    def add(self, wait_time: float, is_vip: bool) -> None:
+        if is_vip:
+            self.vip.add(wait_time)
+            self.vip_sketch.add(wait_time)
+        else:
+            self.regular.add(wait_time)
+            self.regular_sketch.add(wait_time)
+
+    def stats(self, vip: Optional[bool] = None) -> RunningStats:
+        """Statistics for VIP cars (True), regular cars (False) or all (None)."""
+        if vip is None:
+            return self.regular.merge(self.vip)
+        return self.vip if vip else self.regular
+
+    def sketch(self, vip: Optional[bool] = None) -> QuantileSketch:
+        if vip is None:
+            return self.regular_sketch.merge(self.vip_sketch)
+        return self.vip_sketch if vip else self.regular_sketch
+
+    def mean(self) -> float:
+        """Mean wait over all finished cars, without building a merged object."""
+        count = self.regular.count + self.vip.count
+        if count == 0:
+            return 0.0
+        return (self.regular.mean * self.regular.count + self.vip.mean * self.vip.count) / count
+
+    def summary(self, vip: Optional[bool] = None) -> Dict[str, float]:
+        stats = self.stats(vip)
+        sketch = self.sketch(vip)
+        out = {
+            "count": stats.count,
+            "mean": stats.mean,
+            "variance": stats.variance,
+            "std": math.sqrt(stats.variance),
+            "max": stats.max,
+        }
+        for q in self.PERCENTILES:
+            out[f"p{int(q * 100)}"] = sketch.quantile(q)
+        return out